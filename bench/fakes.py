@@ -0,0 +1,424 @@
+"""
+Offline stand-ins for the parts of discord.py and motor that Sonus touches.
+
+REST calls and database operations are counted and can be given a latency,
+nothing goes over the network.
+"""
+import asyncio
+import copy
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+
+import discord
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, ReturnDocument, UpdateOne
+
+ids = itertools.count(10 ** 17)
+
+
+class Rest:
+    """Counts fake REST calls per route."""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def call(self, route: str):
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeRole:
+    def __init__(self, guild, name="@everyone"):
+        self.id = guild.id if name == "@everyone" else next(ids)
+        self.name = name
+        self.guild = guild
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember:
+    def __init__(self, guild, name: str, member_id: int = None, bot: bool = False):
+        self.id = member_id or next(ids)
+        self.guild = guild
+        self.name = name
+        self.display_name = name
+        self.discriminator = "0001"
+        self.bot = bot
+        self.channel = None
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def voice(self):
+        return SimpleNamespace(channel=self.channel) if self.channel else None
+
+    async def move_to(self, channel, *, reason=None):
+        await self.guild.rest.call("PATCH /guilds/{guild_id}/members/{user_id}")
+        if self.channel is None:
+            # Discord can't move members who aren't connected.
+            raise discord.HTTPException(
+                FakeResponse(400), "Target user is not connected to voice."
+            )
+        self.guild.move(self, channel)
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, name: str, position: int = 0, category=None):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.category = category
+        self.bitrate = 64000
+        self.user_limit = 0
+        self.rtc_region = None
+        self.overwrites = {}
+        self.members = []
+        self.deleted = False
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeVoiceChannel) and other.id == self.id
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+    async def edit(self, **fields):
+        await self.guild.rest.call("PATCH /channels/{channel_id}")
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    async def clone(self, *, name=None, reason=None):
+        return await self.guild.create_voice_channel(
+            name or self.name,
+            category=self.category,
+            bitrate=self.bitrate,
+            user_limit=self.user_limit,
+            overwrites=self.overwrites,
+        )
+
+    async def delete(self, *, reason=None):
+        await self.guild.rest.call("DELETE /channels/{channel_id}")
+        if self.deleted:
+            raise discord.NotFound(FakeResponse(404), "Unknown Channel")
+        self.deleted = True
+        self.guild.channels.pop(self.id, None)
+
+    async def set_permissions(self, target, *, overwrite=None, reason=None, **perms):
+        await self.guild.rest.call("PUT /channels/{channel_id}/permissions/{id}")
+
+
+class FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+        self.reason = "Fake"
+
+
+class FakeGuild:
+    def __init__(self, rest: Rest, guild_id: int = None, shard_id: int = 0):
+        self.id = guild_id or next(ids)
+        self.rest = rest
+        self.shard_id = shard_id
+        self.unavailable = False
+        self.channels = {}
+        self.members = {}
+        self.default_role = FakeRole(self)
+        self.me = FakeMember(self, "Sonus", bot=True)
+        # Called with (member, before, after) whenever someone changes channel.
+        self.on_move = None
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+    def add_voice_channel(self, name: str, position: int = 0):
+        channel = FakeVoiceChannel(self, name, position)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_member(self, name: str, member_id: int = None):
+        member = FakeMember(self, name, member_id)
+        self.members[member.id] = member
+        return member
+
+    async def create_voice_channel(
+        self,
+        name,
+        *,
+        category=None,
+        position=0,
+        bitrate=64000,
+        user_limit=0,
+        rtc_region=None,
+        overwrites=None,
+        reason=None,
+    ):
+        await self.rest.call("POST /guilds/{guild_id}/channels")
+        channel = self.add_voice_channel(name, position)
+        channel.category = category
+        channel.bitrate = bitrate
+        channel.user_limit = user_limit
+        channel.rtc_region = rtc_region
+        channel.overwrites = dict(overwrites or {})
+        return channel
+
+    def move(self, member, channel):
+        """Apply a voice state change like the gateway would."""
+        before = member.channel
+        if before is not None and member in before.members:
+            before.members.remove(member)
+        if channel is not None:
+            channel.members.append(member)
+        member.channel = channel
+        if self.on_move is not None:
+            self.on_move(member, before, channel)
+        return before
+
+
+class FakeCursor:
+    def __init__(self, collection, documents):
+        self.collection = collection
+        self.documents = documents
+        self._limit = None
+
+    def sort(self, key, direction=1):
+        self.documents.sort(key=lambda d: d.get(key), reverse=direction == -1)
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self.collection.op("find")
+        for document in self.documents[: self._limit]:
+            yield document
+
+    async def to_list(self, length=None):
+        await self.collection.op("find")
+        return self.documents[: self._limit][:length]
+
+
+class FakeBulkWriteResult:
+    def __init__(self, deleted_count=0, modified_count=0, upserted_count=0):
+        self.deleted_count = deleted_count
+        self.modified_count = modified_count
+        self.upserted_count = upserted_count
+
+
+class FakeCollection:
+    """In-memory stand-in for a motor collection with the operators Sonus uses."""
+
+    def __init__(self, name: str, latency: float = 0, ops: Counter = None):
+        self.name = name
+        self.latency = latency
+        self.documents = {}
+        self.ops = ops if ops is not None else Counter()
+
+    async def op(self, name: str):
+        self.ops[f"{self.name}.{name}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # Query helpers
+
+    @staticmethod
+    def get_path(document, path):
+        for key in path.split("."):
+            if not isinstance(document, dict) or key not in document:
+                return None, False
+            document = document[key]
+        return document, True
+
+    def matches(self, document, query) -> bool:
+        for key, condition in query.items():
+            value, exists = self.get_path(document, key)
+            if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+                if not self.condition(value, exists, condition):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def condition(self, value, exists, condition) -> bool:
+        for operator, operand in condition.items():
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$gt" and not (exists and value is not None and value > operand):
+                return False
+            if operator == "$gte" and not (exists and value is not None and value >= operand):
+                return False
+            if operator == "$exists" and exists != operand:
+                return False
+            if operator == "$not" and self.condition(value, exists, operand):
+                return False
+        return True
+
+    @staticmethod
+    def project(document, projection):
+        if document is None or not projection:
+            return copy.deepcopy(document)
+        return copy.deepcopy(
+            {
+                key: value
+                for key, value in document.items()
+                if key == "_id" or projection.get(key)
+            }
+        )
+
+    @staticmethod
+    def apply(document, update, inserted):
+        for operator, fields in update.items():
+            if operator == "$setOnInsert" and not inserted:
+                continue
+            for path, value in fields.items():
+                *parents, last = path.split(".")
+                target = document
+                for key in parents:
+                    target = target.setdefault(key, {})
+                    if target is None:
+                        break
+                if target is None:
+                    continue
+                if operator in ("$set", "$setOnInsert"):
+                    target[last] = copy.deepcopy(value)
+                elif operator == "$unset":
+                    target.pop(last, None)
+                elif operator == "$inc":
+                    target[last] = target.get(last, 0) + value
+
+    def _find(self, query):
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            document = self.documents.get(query["_id"])
+            return [document] if document is not None else []
+        return [d for d in self.documents.values() if self.matches(d, query)]
+
+    def _update(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            self.apply(found[0], update, False)
+            return found[0], False
+        if not upsert:
+            return None, False
+        document = {k: v for k, v in query.items() if not isinstance(v, dict)}
+        self.apply(document, update, True)
+        self.documents[document["_id"]] = document
+        return document, True
+
+    # Motor API
+
+    async def create_index(self, keys, **kwargs):
+        await self.op("create_index")
+
+    async def find_one(self, query=None, projection=None):
+        await self.op("find_one")
+        found = self._find(query or {})
+        return self.project(found[0] if found else None, projection)
+
+    def find(self, query=None, projection=None, **kwargs):
+        documents = [self.project(d, projection) for d in self._find(query or {})]
+        return FakeCursor(self, documents)
+
+    async def find_one_and_update(
+        self, query, update, projection=None, upsert=False, return_document=False
+    ):
+        await self.op("find_one_and_update")
+        before = self._find(query)
+        before = copy.deepcopy(before[0]) if before else None
+        document, _ = self._update(query, update, upsert)
+        if return_document == ReturnDocument.AFTER:
+            return self.project(document, projection)
+        return self.project(before, projection)
+
+    async def find_one_and_delete(self, query, projection=None):
+        await self.op("find_one_and_delete")
+        found = self._find(query)
+        if not found:
+            return None
+        del self.documents[found[0]["_id"]]
+        return self.project(found[0], projection)
+
+    async def insert_one(self, document):
+        await self.op("insert_one")
+        self.documents[document["_id"]] = copy.deepcopy(document)
+
+    async def update_one(self, query, update, upsert=False):
+        await self.op("update_one")
+        self._update(query, update, upsert)
+
+    async def delete_one(self, query):
+        await self.op("delete_one")
+        for document in self._find(query)[:1]:
+            del self.documents[document["_id"]]
+
+    async def delete_many(self, query):
+        await self.op("delete_many")
+        for document in self._find(query):
+            del self.documents[document["_id"]]
+
+    async def bulk_write(self, requests, ordered=True):
+        await self.op("bulk_write")
+        deleted = modified = upserted = 0
+        for request in requests:
+            query = request._filter
+            if isinstance(request, ReplaceOne):
+                exists = bool(self._find(query))
+                if exists or request._upsert:
+                    self.documents[query["_id"]] = copy.deepcopy(request._doc)
+                    modified += exists
+                    upserted += not exists
+            elif isinstance(request, UpdateOne):
+                _, inserted = self._update(query, request._doc, request._upsert)
+                upserted += inserted
+                modified += not inserted
+            elif isinstance(request, DeleteOne):
+                for document in self._find(query)[:1]:
+                    del self.documents[document["_id"]]
+                    deleted += 1
+            elif isinstance(request, DeleteMany):
+                for document in self._find(query):
+                    del self.documents[document["_id"]]
+                    deleted += 1
+        return FakeBulkWriteResult(deleted, modified, upserted)
+
+    async def count_documents(self, query):
+        await self.op("count_documents")
+        return len(self._find(query))
+
+
+class CountingStorage:
+    """Wraps a storage backend and counts calls per method."""
+
+    def __init__(self, storage, ops: Counter):
+        self.storage = storage
+        self.ops = ops
+
+    def __getattr__(self, name):
+        attribute = getattr(self.storage, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.ops[f"storage.{name}"] += 1
+            return attribute(*args, **kwargs)
+
+        return counted
@@ -0,0 +1,444 @@
+"""
+Measure how many bytes each guild and live temp channel costs Sonus.
+
+    python -m bench.memory --guilds 1000 10000 100000
+    python -m bench.memory --guilds 10000 --members 50 --json after.json
+    python -m bench.memory --guilds 10000 --members 50 --compare after.json
+
+Every guild count runs in a fresh process. Each part of the state is built
+twice, once to see how much resident memory it adds and once under
+tracemalloc for its size and top allocation sites. Guilds are real discord.py
+objects built from synthetic GUILD_CREATE payloads, nothing connects to
+Discord.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import multiprocessing
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+from discord.state import ConnectionState
+
+from bench.voice import report
+from core.cache import GuildCache
+from core.index import ChannelIndex
+from core.memory import resident_memory
+from core.migrations import SCHEMA_VERSION
+
+# Commands with BucketType.member cooldowns, see cogs/edit.py and cogs/misc.py
+COOLDOWNS = [(1, 10)] * 5 + [(1, 4)] * 3
+
+
+class ServerRecord:
+    """A server config as a slotted record instead of the document Sonus caches."""
+
+    __slots__ = ("id", "autochannels", "settings")
+
+    def __init__(self, document: dict):
+        self.id = int(document["_id"])
+        self.autochannels = {
+            int(channel_id): config and AutochannelRecord(config)
+            for channel_id, config in document["autochannels"].items()
+        }
+        self.settings = {
+            k: v
+            for k, v in document.items()
+            if k not in ("_id", "autochannels", "schema", "updated_at")
+        } or None
+
+
+class AutochannelRecord:
+    __slots__ = ("position_bottom", "pool", "grace")
+
+    def __init__(self, config: dict):
+        self.position_bottom = config.get("positionbottom", True)
+        self.pool = config.get("pool", False)
+        self.grace = config.get("grace")
+
+
+class TempChannelRecord:
+    """A temp channel as a slotted record instead of a stored document."""
+
+    __slots__ = ("id", "guild", "creator", "autochannel", "spare", "delete_at")
+
+    def __init__(self, document: dict):
+        self.id = int(document["_id"])
+        self.guild = int(document["guild"])
+        self.creator = document["creator"]
+        self.autochannel = document["autochannel"]
+        self.spare = document.get("spare", False)
+        self.delete_at = document.get("delete_at")
+
+
+class World:
+    """Synthetic guilds, each with an autochannel, a text channel and members."""
+
+    def __init__(self, guilds: int, members: int, busy: float, voice: int):
+        ids = itertools.count(10 ** 17)
+        self.guilds = []
+        for _ in range(guilds):
+            guild = SimpleNamespace(
+                id=next(ids),
+                autochannel=next(ids),
+                text_channel=next(ids),
+                members=[next(ids) for _ in range(members)],
+                temp_channel=None,
+            )
+            self.guilds.append(guild)
+        # Every 1/busy-th guild has one temp channel with ``voice`` members.
+        step = round(1 / busy) if busy else 0
+        self.busy = self.guilds[::step] if step else []
+        for guild in self.busy:
+            guild.temp_channel = next(ids)
+            guild.voice = guild.members[:voice]
+
+    def guild_payload(self, guild) -> dict:
+        return {
+            "id": str(guild.id),
+            "name": "guild",
+            "member_count": len(guild.members),
+            "roles": [
+                {
+                    "id": str(guild.id),
+                    "name": "@everyone",
+                    "permissions": "104324673",
+                    "position": 0,
+                }
+            ],
+            "channels": [
+                voice_channel_payload(guild.autochannel, "start vc!", 0),
+                {
+                    "id": str(guild.text_channel),
+                    "type": 0,
+                    "name": "general",
+                    "position": 0,
+                },
+            ],
+            "members": [member_payload(member_id) for member_id in guild.members],
+            "emojis": [],
+            "features": [],
+        }
+
+    def server_document(self, guild) -> dict:
+        # As returned by get_server
+        return {
+            "_id": str(guild.id),
+            "autochannels": {str(guild.autochannel): {"positionbottom": True}},
+            "schema": SCHEMA_VERSION,
+            "updated_at": time.time(),
+        }
+
+    def temp_channel_document(self, guild) -> dict:
+        return {
+            "_id": str(guild.temp_channel),
+            "guild": str(guild.id),
+            "creator": guild.voice[0],
+            "autochannel": guild.autochannel,
+        }
+
+
+def voice_channel_payload(channel_id: int, name: str, position: int) -> dict:
+    return {
+        "id": str(channel_id),
+        "type": 2,
+        "name": name,
+        "position": position,
+        "bitrate": 64000,
+        "user_limit": 0,
+        "permission_overwrites": [],
+    }
+
+
+def member_payload(member_id: int) -> dict:
+    return {
+        "user": {
+            "id": str(member_id),
+            "username": f"member {member_id}",
+            "discriminator": "0001",
+            "avatar": None,
+        },
+        "roles": [],
+        "joined_at": "2021-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+    }
+
+
+def voice_state_payload(member_id: int, channel_id: int) -> dict:
+    return {
+        "user_id": str(member_id),
+        "channel_id": str(channel_id),
+        "session_id": "session",
+        "deaf": False,
+        "mute": False,
+        "self_deaf": False,
+        "self_mute": False,
+        "suppress": False,
+        "member": member_payload(member_id),
+    }
+
+
+def connection_state(lean: bool) -> ConnectionState:
+    # Same intents and cache flags as Sonus in full and lean mode.
+    intents = discord.Intents.default()
+    intents.members = not lean
+    return ConnectionState(
+        dispatch=lambda *args: None,
+        handlers={},
+        hooks={},
+        syncer=None,
+        http=None,
+        loop=asyncio.get_event_loop(),
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+        chunk_guilds_at_startup=not lean,
+    )
+
+
+def build_gateway(world: World, lean: bool) -> ConnectionState:
+    state = connection_state(lean)
+    for guild in world.guilds:
+        state._add_guild(discord.Guild(data=world.guild_payload(guild), state=state))
+    return state
+
+
+def build_temp_channels(world: World, state: ConnectionState) -> ChannelIndex:
+    """Live temp channels, their voice states and index entries."""
+    index = ChannelIndex()
+    for guild in world.busy:
+        cached = state._get_guild(guild.id)
+        channel = discord.VoiceChannel(
+            state=state,
+            guild=cached,
+            data=voice_channel_payload(guild.temp_channel, "member's voice call", 1),
+        )
+        cached._add_channel(channel)
+        for member_id in guild.voice:
+            member, _, _ = cached._update_voice_state(
+                voice_state_payload(member_id, guild.temp_channel), guild.temp_channel
+            )
+            # Lean mode only caches members in voice
+            if state.member_cache_flags.voice and member is not None:
+                cached._add_member(member)
+        index.temp_channels[guild.temp_channel] = guild.autochannel
+    return index
+
+
+def build_server_configs(world: World) -> GuildCache:
+    cache = GuildCache(maxsize=len(world.guilds))
+    for guild in world.guilds:
+        cache.set(str(guild.id), world.server_document(guild))
+    return cache
+
+
+def build_server_records(world: World) -> dict:
+    return {
+        guild.id: ServerRecord(world.server_document(guild)) for guild in world.guilds
+    }
+
+
+def build_index(world: World) -> ChannelIndex:
+    index = ChannelIndex()
+    index.autochannels.update(guild.autochannel for guild in world.guilds)
+    return index
+
+
+def build_temp_channel_documents(world: World) -> dict:
+    return {
+        guild.temp_channel: world.temp_channel_document(guild) for guild in world.busy
+    }
+
+
+def build_temp_channel_records(world: World) -> dict:
+    return {
+        guild.temp_channel: TempChannelRecord(world.temp_channel_document(guild))
+        for guild in world.busy
+    }
+
+
+def build_cooldowns(world: World) -> list:
+    """Buckets of every member cooldown command used once by every member in voice."""
+    mappings = [
+        commands.CooldownMapping.from_cooldown(rate, per, commands.BucketType.member)
+        for rate, per in COOLDOWNS
+    ]
+    # All at once, buckets older than their cooldown would be dropped.
+    now = time.time()
+    for guild in world.busy:
+        for member_id in guild.voice:
+            message = SimpleNamespace(
+                guild=SimpleNamespace(id=guild.id), author=SimpleNamespace(id=member_id)
+            )
+            for mapping in mappings:
+                mapping.get_bucket(message, now).update_rate_limit(now)
+    return mappings
+
+
+def measure(build, top: int, base=None) -> dict:
+    """
+    Resident memory and traced size of what ``build`` returns. ``base`` builds
+    what ``build`` is given and isn't counted.
+    """
+    given = base() if base else None
+    gc.collect()
+    rss = resident_memory()
+    kept = build(given)
+    gc.collect()
+    rss = resident_memory() - rss
+    del kept, given
+    gc.collect()
+
+    given = base() if base else None
+    gc.collect()
+    tracemalloc.start()
+    kept = build(given)
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+    tracemalloc.stop()
+    del kept, given
+    statistics = snapshot.statistics("lineno")
+    return {
+        "bytes": sum(stat.size for stat in statistics),
+        "rss": rss,
+        "sites": [
+            (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size)
+            for stat in statistics[:top]
+        ],
+    }
+
+
+def run(guilds: int, members: int, busy: float, voice: int, top: int) -> dict:
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    world = World(guilds, members, busy, voice)
+    temp_channels = len(world.busy)
+    # name -> (build, base, what it's counted per, count)
+    parts = {
+        "gateway_full": (lambda _: build_gateway(world, False), None, "guild", guilds),
+        "gateway_lean": (lambda _: build_gateway(world, True), None, "guild", guilds),
+        "server_configs": (
+            lambda _: build_server_configs(world),
+            None,
+            "guild",
+            guilds,
+        ),
+        "server_records": (
+            lambda _: build_server_records(world),
+            None,
+            "guild",
+            guilds,
+        ),
+        "index": (lambda _: build_index(world), None, "guild", guilds),
+        "temp_channels_full": (
+            lambda state: build_temp_channels(world, state),
+            lambda: build_gateway(world, False),
+            "temp channel",
+            temp_channels,
+        ),
+        "temp_channels_lean": (
+            lambda state: build_temp_channels(world, state),
+            lambda: build_gateway(world, True),
+            "temp channel",
+            temp_channels,
+        ),
+        "temp_channel_documents": (
+            lambda _: build_temp_channel_documents(world),
+            None,
+            "temp channel",
+            temp_channels,
+        ),
+        "temp_channel_records": (
+            lambda _: build_temp_channel_records(world),
+            None,
+            "temp channel",
+            temp_channels,
+        ),
+        "cooldowns": (lambda _: build_cooldowns(world), None, "guild", guilds),
+    }
+    results = {}
+    for name, (build, base, per, count) in parts.items():
+        results[name] = dict(measure(build, top, base), per=per, count=count)
+    return results
+
+
+def compare(results: dict, slotted: str, documents: str) -> float:
+    """Percent of memory saved by records over documents."""
+    if not results[documents]["bytes"]:
+        return 0.0
+    return (1 - results[slotted]["bytes"] / results[documents]["bytes"]) * 100
+
+
+def flatten(guilds: int, results: dict) -> dict:
+    flat = {"guilds": guilds}
+    for name, part in results.items():
+        count = part["count"]
+        flat[f"{name}_mb"] = part["bytes"] / 2 ** 20
+        flat[f"{name}_rss_mb"] = part["rss"] / 2 ** 20
+        flat[f"{name}_bytes_per_{part['per'].replace(' ', '_')}"] = (
+            part["bytes"] / count if count else 0.0
+        )
+    flat["server_records_saved_percent"] = compare(
+        results, "server_records", "server_configs"
+    )
+    flat["temp_channel_records_saved_percent"] = compare(
+        results, "temp_channel_records", "temp_channel_documents"
+    )
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory per guild and per temp channel."
+    )
+    parser.add_argument(
+        "--guilds", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--members", type=int, default=10, help="members per guild")
+    parser.add_argument(
+        "--busy",
+        type=float,
+        default=0.1,
+        help="share of guilds with a live temp channel",
+    )
+    parser.add_argument(
+        "--voice", type=int, default=2, help="members in each temp channel"
+    )
+    parser.add_argument("--top", type=int, default=3, help="allocation sites to show")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    earlier = {}
+    if args.compare:
+        with open(args.compare) as file:
+            earlier = {str(run["guilds"]): run for run in json.load(file)}
+    runs = []
+    # A fresh process per size so memory freed by the last one isn't reused.
+    context = multiprocessing.get_context("spawn")
+    for guilds in args.guilds:
+        with context.Pool(1) as pool:
+            results = pool.apply(
+                run, (guilds, args.members, args.busy, args.voice, args.top)
+            )
+        print(f"{guilds} guilds")
+        flat = flatten(guilds, results)
+        report(flat, earlier.get(str(guilds)))
+        for name, part in results.items():
+            print(f"  {name}:")
+            for site, size in part["sites"]:
+                print(f"    {size / 1024:10.1f} KiB  {site}")
+        runs.append(flat)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(runs, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Replay voice state traces through Sonus without touching the network.
+
+    python -m bench.voice guilds --guilds 10000
+    python -m bench.voice burst --members 500 --rest-latency 0.05
+    python -m bench.voice churn --members 50
+    python -m bench.voice trace recorded.jsonl --json after.json --compare before.json
+
+A trace is a JSON lines file. The first line lists the autochannels of each
+guild, every other line moves a member to a channel or disconnects them::
+
+    {"autochannels": {"<guild id>": [<channel id>, ...]}}
+    {"t": 0.0, "guild": <guild id>, "member": <member id>, "channel": <channel id or null>}
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from bench.fakes import CountingStorage, FakeCollection, FakeGuild, Rest
+from core.index import NOOP
+from core.storage import MemoryStorage, SQLiteStorage, WriteBehindStorage
+from core.storage.mongo import MongoStorage
+
+
+def synthetic_guilds(guilds: int, seed: int = 0):
+    """Every guild has one autochannel, one member joins it and later leaves."""
+    rng = random.Random(seed)
+    autochannels = {str(guild): [guild * 10] for guild in range(1, guilds + 1)}
+    joins = [
+        {"t": rng.random(), "guild": guild, "member": guild * 100, "channel": guild * 10}
+        for guild in range(1, guilds + 1)
+    ]
+    leaves = [
+        {"t": 1 + rng.random(), "guild": guild, "member": guild * 100, "channel": None}
+        for guild in range(1, guilds + 1)
+    ]
+    return autochannels, sorted(joins + leaves, key=lambda e: e["t"])
+
+
+def synthetic_burst(members: int, seed: int = 0):
+    """Members pile into one autochannel at once and leave again."""
+    rng = random.Random(seed)
+    autochannels = {"1": [10]}
+    joins = [
+        {"t": rng.random() * 0.1, "guild": 1, "member": 1000 + m, "channel": 10}
+        for m in range(members)
+    ]
+    leaves = [
+        {"t": 1 + rng.random(), "guild": 1, "member": 1000 + m, "channel": None}
+        for m in range(members)
+    ]
+    return autochannels, sorted(joins + leaves, key=lambda e: e["t"])
+
+
+def synthetic_churn(joins: int, seed: int = 0):
+    """One member joins an autochannel and leaves again over and over."""
+    rng = random.Random(seed)
+    autochannels = {"1": [10]}
+    events = []
+    t = 0.0
+    for _ in range(joins):
+        events.append({"t": t, "guild": 1, "member": 1000, "channel": 10})
+        t += 0.05 + rng.random() * 0.05
+        events.append({"t": t, "guild": 1, "member": 1000, "channel": None})
+        t += 0.05 + rng.random() * 0.05
+    return autochannels, events
+
+
+def load_trace(path: str):
+    with open(path) as file:
+        autochannels = json.loads(file.readline())["autochannels"]
+        events = [json.loads(line) for line in file if line.strip()]
+    return autochannels, events
+
+
+class World:
+    """Fake guilds, channels and members created on demand from a trace."""
+
+    def __init__(self, rest: Rest):
+        self.rest = rest
+        self.guilds = {}
+        self.channels = {}
+        self.on_move = None
+
+    def guild(self, guild_id: int):
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = FakeGuild(self.rest, guild_id)
+            guild.on_move = self.on_move
+        return guild
+
+    def channel(self, guild, channel_id: int):
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            channel = guild.add_voice_channel("voice", position=len(guild.channels))
+            # Keep the ids from the trace.
+            del guild.channels[channel.id]
+            channel.id = channel_id
+            guild.channels[channel_id] = channel
+        return channel
+
+    def get_channel(self, channel_id: int):
+        for guild in self.guilds.values():
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+
+def percentile(values, percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def make_storage(
+    backend: str, ops: Counter, mongo_latency: float, write_behind: float = 0
+):
+    if backend == "mongo":
+        # The real mongo backend on top of in-memory collections.
+        storage = MongoStorage(
+            SimpleNamespace(
+                servers=FakeCollection("servers", mongo_latency, ops),
+                channels=FakeCollection("channels", mongo_latency, ops),
+            )
+        )
+    elif backend == "sqlite":
+        storage = SQLiteStorage(os.path.join(tempfile.mkdtemp(), "sonus.db"))
+    else:
+        storage = MemoryStorage()
+    if write_behind:
+        storage = WriteBehindStorage(storage, interval=write_behind / 1000)
+    return CountingStorage(storage, ops)
+
+
+def make_bot(world: World, storage):
+    from bot import Sonus
+
+    bot = Sonus(storage=storage)
+    bot.get_guild = world.guilds.get
+    bot.get_channel = world.get_channel
+    return bot
+
+
+async def replay(bot, world: World, autochannels: dict, events: list, speed: float):
+    storage = bot.storage.storage
+    await storage.setup()
+    for guild_id, channel_ids in autochannels.items():
+        guild = world.guild(int(guild_id))
+        for channel_id in channel_ids:
+            world.channel(guild, int(channel_id))
+            await storage.set_autochannel(str(guild_id), str(channel_id), None)
+    await bot.index.load(storage, log=lambda message: None)
+    bot.storage.ops.clear()
+
+    dispatcher = bot.voice_dispatcher
+    durations = []
+    handler = dispatcher.handler
+
+    async def timed(member, before, after):
+        start = time.perf_counter()
+        try:
+            await handler(member, before, after)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    dispatcher.handler = timed
+    dispatcher.start()
+    pending = set()
+
+    def on_move(member, before, after):
+        # Same filter as Sonus.on_voice_state_update
+        if before is not after:
+            bot.cancel_deletion(after)
+        if bot.index.classify(before, after) == NOOP:
+            return
+        pending.add(
+            asyncio.ensure_future(dispatcher.put(member.guild.id, member, before, after))
+        )
+
+    world.on_move = on_move
+    for guild in world.guilds.values():
+        guild.on_move = on_move
+
+    start = time.perf_counter()
+    for event in events:
+        if speed:
+            delay = event["t"] / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        guild = world.guild(event["guild"])
+        member = guild.get_member(event["member"]) or guild.add_member(
+            f"member {event['member']}", event["member"]
+        )
+        channel = event.get("channel")
+        guild.move(member, world.channel(guild, channel) if channel else None)
+        await asyncio.sleep(0)
+    while pending or dispatcher.queues:
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            pending -= done
+        else:
+            await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop()
+    await storage.close()
+    return durations, elapsed
+
+
+def report(results: dict, compare: dict = None):
+    for key, value in results.items():
+        line = f"{key:>24}: {value:.6g}" if type(value) is float else f"{key:>24}: {value}"
+        if compare and type(compare.get(key)) in (int, float) and compare[key]:
+            change = (value - compare[key]) / compare[key] * 100
+            line += f"  ({change:+.1f}%)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the voice state hot path.")
+    parser.add_argument("scenario", choices=["guilds", "burst", "churn", "trace"])
+    parser.add_argument("trace", nargs="?", help="trace file for the trace scenario")
+    parser.add_argument("--guilds", type=int, default=10000)
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument(
+        "--storage", choices=["mongo", "sqlite", "memory"], default="mongo"
+    )
+    parser.add_argument("--rest-latency", type=float, default=0.0)
+    parser.add_argument("--mongo-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="replay speed, 0 replays everything at once",
+    )
+    parser.add_argument(
+        "--write-behind",
+        type=float,
+        default=0,
+        help="buffer temp channel writes for this many milliseconds",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    if args.scenario == "guilds":
+        autochannels, events = synthetic_guilds(args.guilds, args.seed)
+    elif args.scenario == "burst":
+        autochannels, events = synthetic_burst(args.members, args.seed)
+    elif args.scenario == "churn":
+        autochannels, events = synthetic_churn(args.members, args.seed)
+    else:
+        if not args.trace:
+            parser.error("the trace scenario needs a trace file")
+        autochannels, events = load_trace(args.trace)
+
+    rest = Rest(args.rest_latency)
+    ops = Counter()
+    world = World(rest)
+    bot = make_bot(world, make_storage(args.storage, ops, args.mongo_latency, args.write_behind))
+    durations, elapsed = bot.loop.run_until_complete(
+        replay(bot, world, autochannels, events, args.speed)
+    )
+
+    handled = len(durations)
+    storage_ops = sum(n for op, n in ops.items() if op.startswith("storage."))
+    results = {
+        "scenario": args.scenario,
+        "trace_events": len(events),
+        "handled_events": handled,
+        "seconds": elapsed,
+        "events_per_second": handled / elapsed if elapsed else 0.0,
+        "handler_p50_ms": percentile(durations, 50) * 1000,
+        "handler_p99_ms": percentile(durations, 99) * 1000,
+        "handler_mean_ms": statistics.mean(durations) * 1000 if durations else 0.0,
+        "storage": args.storage,
+        "storage_ops": storage_ops,
+        "storage_ops_per_event": storage_ops / handled if handled else 0.0,
+        "rest_calls": rest.total,
+        "rest_calls_per_event": rest.total / handled if handled else 0.0,
+        "coalesced": bot.voice_dispatcher.coalesced,
+        "cache_hit_rate": bot.cache.stats()["hit_rate"],
+        "quota_limited": sum(bot.quota.limited.values()),
+    }
+    for op, count in sorted(ops.items()):
+        # storage.<method> for every backend, <collection>.<op> for mongo.
+        results[op if op.startswith("storage.") else f"mongo.{op}"] = count
+    for route, count in sorted(rest.calls.items()):
+        results[f"rest.{route}"] = count
+
+    compare = None
+    if args.compare:
+        with open(args.compare) as file:
+            compare = json.load(file)
+    report(results, compare)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
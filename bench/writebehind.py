@@ -0,0 +1,257 @@
+"""
+Check the guarantees of WriteBehindStorage against real backends.
+
+    python -m bench.writebehind
+    python -m bench.writebehind --storage sqlite
+
+Runs every check on a fresh memory and sqlite backend, nothing connects to
+mongodb. Exits with 1 if any check fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import traceback
+
+from core.storage import MemoryStorage, SQLiteStorage, WriteBehindStorage
+from core.storage.writebehind import ADD, CLAIM, DELETE, merge
+
+
+class Flaky:
+    """
+    Wraps a storage backend and fails the next ``failures`` batch writes, after
+    storing them if ``partial`` is set.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.failures = 0
+        self.partial = False
+        # Set to hold batch writes until it's set again.
+        self.gate = None
+        self.batches = []
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    async def write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        self.batches.append(
+            ({channel["_id"] for channel in adds}, set(claims), set(deletes))
+        )
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.failures and not self.partial:
+            self.failures -= 1
+            raise ConnectionError("fake outage")
+        await self.storage.write_temp_channels(adds, claims, deletes)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("fake timeout")
+
+
+def channel(channel_id: str, **fields) -> dict:
+    return dict({"_id": channel_id, "guild": "1", "autochannel": 10}, **fields)
+
+
+def check(condition, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def check_merge():
+    add = (ADD, channel("1", creator=5, spare=True))
+    claim = (CLAIM, 6)
+    delete = (DELETE, None)
+    check(merge(None, claim) == claim, "anything after nothing is kept")
+    check(merge(delete, add) == add, "an add replaces anything")
+    merged = merge(add, claim)
+    check(merged[0] == ADD, "a claim of a pending add stays an add")
+    check(merged[1]["creator"] == 6, "the claim sets the creator")
+    check("spare" not in merged[1], "a claimed spare isn't spare anymore")
+    check(add[1]["spare"], "merging doesn't change the older write")
+    check(merge(claim, (CLAIM, 7)) == (CLAIM, 7), "the newest claim wins")
+    check(merge(delete, claim) == delete, "a claim of a deleted channel is dropped")
+    check(merge(add, delete) is None, "deleting an unstored add writes nothing")
+    check(
+        merge(add, delete, flushed=True) == delete,
+        "deleting an add that may be stored is written",
+    )
+    check(merge(claim, delete) == delete, "a delete replaces a claim")
+
+
+async def check_reads(storage, backing):
+    await backing.add_temp_channel(channel("2", creator=5, spare=True))
+    await backing.add_temp_channel(channel("3", creator=5))
+    await storage.add_temp_channel(channel("1", creator=5))
+    await storage.claim_temp_channel("2", 6)
+    await storage.delete_temp_channel("3")
+    check(await backing.get_temp_channel("1") is None, "writes are buffered")
+
+    stored = await storage.get_temp_channel("1")
+    check(stored and stored["creator"] == 5, "a pending add is read back")
+    stored = await storage.get_temp_channel("1", fields=("creator",))
+    check(stored == {"_id": "1", "creator": 5}, "fields of a pending add")
+    stored = await storage.get_temp_channel("2")
+    check(stored and stored["creator"] == 6, "a pending claim is read back")
+    check(not stored.get("spare"), "a pending claim isn't spare")
+    check(await storage.get_temp_channel("3") is None, "a pending delete hides it")
+
+    await storage.add_temp_channel(channel("4", creator=5))
+    check(await storage.delete_temp_channel("4"), "deleting a pending add")
+    check("4" not in storage.pending, "an add and its delete cancel out")
+    check(not await storage.delete_temp_channel("4"), "deleting it again")
+    check(not await storage.delete_temp_channel("5"), "deleting an unknown channel")
+    check("5" not in storage.pending, "unknown channels aren't deleted")
+
+    await storage.flush()
+    check((await backing.get_temp_channel("1"))["creator"] == 5, "adds are stored")
+    check((await backing.get_temp_channel("2"))["creator"] == 6, "claims are stored")
+    check(await backing.get_temp_channel("3") is None, "deletes are stored")
+    check(await backing.get_temp_channel("4") is None, "cancelled adds aren't")
+    ids = [stored["_id"] async for stored in storage.temp_channels()]
+    check(ids == ["1", "2"], "iterating sees every write")
+
+
+async def check_retry(storage, backing):
+    flaky = storage.storage
+    await backing.add_temp_channel(channel("2", creator=5))
+
+    # The first batch fails while newer writes of the same channels queue up.
+    flaky.failures = 1
+    flaky.gate = asyncio.Event()
+    await storage.add_temp_channel(channel("1", creator=5))
+    await storage.delete_temp_channel("2")
+    flush = asyncio.ensure_future(storage.flush())
+    await asyncio.sleep(0)
+    check(storage.writing, "the batch is being written")
+    await storage.delete_temp_channel("1")
+    await storage.add_temp_channel(channel("2", creator=7))
+    stored = await storage.get_temp_channel("2")
+    check(stored and stored["creator"] == 7, "reads see writes newer than a batch")
+    flaky.gate.set()
+    await flush
+    check(storage.failures == 1, "the batch failed")
+    check(storage.pending.get("1") == (DELETE, None), "a delete after a failed add")
+    check(storage.pending.get("2", (None,))[0] == ADD, "an add after a failed delete")
+
+    # The retry is scheduled on its own.
+    flaky.gate = None
+    for _ in range(100):
+        if not storage.pending and storage.flushing is None:
+            break
+        await asyncio.sleep(storage.retry)
+    check(not storage.pending, "the failed batch was retried")
+    check(await backing.get_temp_channel("1") is None, "the newer delete won")
+    stored = await backing.get_temp_channel("2")
+    check(stored and stored["creator"] == 7, "the newer add won")
+    check(flaky.batches[-1] == ({"2"}, set(), {"1"}), "the retry was one batch")
+
+    # A batch that was stored but reported as failed, like after a timeout.
+    flaky.failures = 1
+    flaky.partial = True
+    await storage.add_temp_channel(channel("3", creator=5))
+    await storage.flush()
+    check(await backing.get_temp_channel("3"), "the failed batch was stored")
+    check(await storage.delete_temp_channel("3"), "deleting a possibly stored add")
+    check(storage.pending.get("3") == (DELETE, None), "the delete is kept")
+    await storage.flush()
+    check(await backing.get_temp_channel("3") is None, "the stored add was deleted")
+    check(not storage.maybe_stored, "written channels are known again")
+
+
+async def check_close(storage, backing, reopen):
+    flaky = storage.storage
+    for channel_id in ("1", "2", "3"):
+        await storage.add_temp_channel(channel(channel_id, creator=5))
+    await storage.claim_temp_channel("2", 6)
+    # The first try fails, close retries.
+    flaky.failures = 1
+    await storage.close()
+    check(not storage.pending, "close flushed everything")
+    check(storage.failures == 1, "the first flush failed")
+
+    backing = reopen()
+    await backing.setup()
+    try:
+        ids = [stored["_id"] async for stored in backing.temp_channels()]
+        check(ids == ["1", "2", "3"], "writes flushed on close are stored")
+        claimed = await backing.get_temp_channel("2")
+        check(claimed["creator"] == 6, "claims flushed on close are stored")
+    finally:
+        await backing.close()
+
+
+def backends(name: str):
+    """Functions making a fresh ``name`` backend and opening the last one again."""
+    made = []
+    if name == "memory":
+        # Memory storage keeps its data after closing.
+        def make():
+            made.append(MemoryStorage())
+            return made[-1]
+
+        return make, lambda: made[-1]
+    directory = tempfile.mkdtemp()
+
+    def make():
+        made.append(os.path.join(directory, f"{len(made)}.db"))
+        return SQLiteStorage(made[-1])
+
+    return make, lambda: SQLiteStorage(made[-1])
+
+
+async def run_check(function, backing, reopen):
+    storage = WriteBehindStorage(
+        Flaky(backing), interval=60, retry=0.01, log=lambda message: None
+    )
+    await storage.setup()
+    if function is check_close:
+        return await function(storage, backing, reopen)
+    try:
+        await function(storage, backing)
+    finally:
+        await storage.close()
+
+
+async def run(name: str) -> int:
+    make, reopen = backends(name)
+    failed = 0
+    for check_name, function in (
+        ("merge", None),
+        ("reads", check_reads),
+        ("retry", check_retry),
+        ("close", check_close),
+    ):
+        try:
+            if function is None:
+                check_merge()
+            else:
+                await run_check(function, make(), reopen)
+        except Exception:
+            failed += 1
+            print(f"{name:>8} {check_name:<8} FAILED")
+            traceback.print_exc()
+        else:
+            print(f"{name:>8} {check_name:<8} ok")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the guarantees of write-behind storage."
+    )
+    parser.add_argument(
+        "--storage",
+        choices=["memory", "sqlite"],
+        nargs="+",
+        default=["memory", "sqlite"],
+    )
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+    failed = sum(loop.run_until_complete(run(name)) for name in args.storage)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,94 @@
-__version__ = "1.2.6"
+import time
 
+# Start of the import timing in the startup report
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import os
 import string
+import traceback
+from collections import Counter
 from datetime import datetime
 
 import discord
-import sentry_sdk
 from discord.ext import commands, tasks
 from discord_components import DiscordComponents
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+
+from core import metrics
+from core.cache import GuildCache
+from core.context import SonusContext
+from core.collector import GarbageCollector
+from core.dispatcher import VoiceDispatcher
+from core.index import NOOP, ChannelIndex
+from core.memory import memory_stats
+from core.paginator import Paginator
+from core.pool import ChannelPool
+from core.quota import ChurnQuota
+from core.reconcile import reconcile
+from core.scheduler import (
+    CHANNEL,
+    MOVE,
+    RateLimitTracker,
+    RestScheduler,
+    channel_route,
+    guild_channels_route,
+    member_route,
+)
+from core.sampling import AdaptiveSampler
+from core.shards import parse_shard_ids
+from core.snapshot import Snapshot, shard_key
+from core.startup import StartupTimer
+from core.storage import create_storage
+from core.timers import TimerWheel
+from core.version import __version__
 
 load_dotenv()
-sentry_sdk.init(traces_sample_rate=1.0, release=__version__)
 
 
-class Sonus(commands.Bot):
+def init_sentry():
+    # Imported here, sentry_sdk is slow to import and only needed once connected.
+    import sentry_sdk
+
+    if os.environ.get("SENTRY_TRACES_SAMPLE_RATE"):
+        sentry_sdk.init(
+            traces_sample_rate=float(os.environ["SENTRY_TRACES_SAMPLE_RATE"]),
+            release=__version__,
+        )
+    else:
+        sentry_sdk.init(
+            traces_sampler=AdaptiveSampler(
+                float(os.environ.get("SENTRY_TRACES_PER_MINUTE", 60))
+            ),
+            release=__version__,
+        )
+
+
+class Sonus(commands.AutoShardedBot):
     def __init__(self, *args, **kwargs):
+        self.startup_timer = StartupTimer(
+            IMPORT_STARTED, float(os.environ.get("IMPORT_BUDGET", 1.0))
+        )
+        self.startup_timer.mark("imports")
         intents = discord.Intents.default()
-        intents.members = True
+        # Lean mode only caches members in voice, full mode caches every member.
+        self.lean = os.environ.get("LEAN_MODE", "").lower() in ("1", "true")
+        if self.lean:
+            intents.members = False
+            kwargs.setdefault(
+                "member_cache_flags", discord.MemberCacheFlags.from_intents(intents)
+            )
+            kwargs.setdefault("chunk_guilds_at_startup", False)
+        else:
+            intents.members = True
+        # Sharding, leave both empty to use the recommended number of shards.
+        shard_count = os.environ.get("SHARD_COUNT", None)
+        if shard_count:
+            kwargs.setdefault("shard_count", int(shard_count))
+        kwargs.setdefault("shard_ids", parse_shard_ids(os.environ.get("SHARD_IDS")))
+        # Set when running in a cluster started by launcher.py
+        self.cluster = kwargs.pop("cluster", None)
+        storage = kwargs.pop("storage", None)
         super().__init__(
             command_prefix=commands.when_mentioned,
             case_insensitive=True,
@@ -28,15 +98,81 @@ class Sonus(commands.Bot):
         )
         # Startup time
         self.startup = datetime.now()
+        # Shard id -> time it started connecting
+        self.shard_connect_times = {}
         # Cogs
-        self.loading_cogs = ["cogs.setup", "cogs.edit", "cogs.misc", "jishaku"]
-        # Init mongodb
-        self.mongo_uri = os.environ.get("MONGO_URI", None)
-        if self.mongo_uri is None or len(self.mongo_uri.strip()) == 0:
-            print("\nA mongodb uri is necessary for the bot to function.\n")
-            raise RuntimeError
-        self.db = AsyncIOMotorClient(self.mongo_uri).sonus
-        self.servers = self.db.servers
+        self.loading_cogs = [
+            "cogs.setup",
+            "cogs.edit",
+            "cogs.misc",
+            "cogs.owner",
+            "cogs.profile",
+        ]
+        # Optional extensions, loaded once connected
+        self.deferred_cogs = ["jishaku"]
+        # Init storage
+        self.storage = storage or create_storage()
+        self.started = False
+        # Guild config cache
+        self.cache = GuildCache(
+            maxsize=int(os.environ.get("CACHE_SIZE", 10000)),
+            ttl=float(os.environ.get("CACHE_TTL", 600)),
+        )
+        self.cache_watch = os.environ.get("CACHE_WATCH", "").lower() in ("1", "true")
+        # Tracked channel ids
+        self.index = ChannelIndex()
+        self.index_loaded = None
+        # Warm restart state
+        self.snapshot = None
+        snapshot_path = os.environ.get("SNAPSHOT_PATH")
+        if snapshot_path:
+            if self.cluster:
+                snapshot_path += f".{self.cluster.cluster_id}"
+            self.snapshot = Snapshot(
+                self,
+                snapshot_path,
+                shard_key(kwargs.get("shard_count"), kwargs.get("shard_ids")),
+                interval=float(os.environ.get("SNAPSHOT_INTERVAL", 0)),
+            )
+        # Voice state events
+        self.voice_dispatcher = VoiceDispatcher(
+            self.handle_voice_state,
+            workers=int(os.environ.get("VOICE_WORKERS", 16)),
+            maxsize=int(os.environ.get("VOICE_QUEUE_SIZE", 500)),
+            on_error=self.on_voice_error,
+        )
+        # Channels members and servers can make a minute
+        self.quota = ChurnQuota(
+            int(os.environ.get("QUOTA_MEMBER", 5)),
+            int(os.environ.get("QUOTA_SERVER", 0)),
+        )
+        self.quota_max_wait = float(os.environ.get("QUOTA_MAX_WAIT", 30))
+        # Spare channels
+        self.pool = ChannelPool(self, max_size=int(os.environ.get("POOL_SIZE", 3)))
+        # Empty temp channels waiting to be deleted
+        self.grace_period = float(os.environ.get("GRACE_PERIOD", 0))
+        self.deletions = TimerWheel()
+        # Servers that were unavailable during reconcile
+        self.unreconciled = set()
+        self.reconcile_later = None
+        # Stale record cleanup
+        self.collector = GarbageCollector(self)
+        # Metrics endpoint
+        self.metrics_port = int(os.environ.get("METRICS_PORT", 0))
+        metrics.registry.gauge(
+            "sonus_voice_queue_depth",
+            "Voice state events waiting to be handled.",
+            function=lambda: self.voice_dispatcher.depth,
+        )
+        # REST calls used by joins, calls per join -> number of joins
+        self.join_calls = Counter()
+        # REST calls by priority
+        self.rest = RestScheduler(int(os.environ.get("REST_CONCURRENCY", 10)))
+        RateLimitTracker(self.rest).install()
+        # Button pages
+        self.paginator = Paginator(self)
+        # Built help embeds and command index, see SonusHelpCommand
+        self.help_cache = {}
         # Get invite link
         self.invite = os.environ.get("INVITE_LINK", None)
         # Startup message
@@ -44,46 +180,217 @@ class Sonus(commands.Bot):
         print("Sonus")
         print("By: Cyrus")
         print("=" * 24)
+        self.startup_timer.mark("init")
         # Load cogs
-        for cog in self.loading_cogs:
+        self.load_cogs(self.loading_cogs)
+        self.startup_timer.mark("cogs")
+        if self.startup_timer.over_budget():
+            print(
+                f"Imports took {self.startup_timer.stages['imports']:.2f}s, over the "
+                f"{self.startup_timer.import_budget:.2f}s budget. "
+                "Use python -X importtime bot.py to find slow imports."
+            )
+
+    def load_cogs(self, cogs: list):
+        for cog in cogs:
             print(f"Loading {cog}...")
+            start = time.perf_counter()
             try:
                 self.load_extension(cog)
-                print(f"Successfully loaded {cog}.")
+                print(
+                    f"Successfully loaded {cog} in {time.perf_counter() - start:.2f}s."
+                )
             except Exception as e:
                 print(f"Failed to load {cog}. Error: {e}")
 
+    async def get_context(self, message, *, cls=SonusContext):
+        return await super().get_context(message, cls=cls)
+
+    def load_extension(self, name):
+        super().load_extension(name)
+        self.help_cache.clear()
+
+    def unload_extension(self, name):
+        super().unload_extension(name)
+        self.help_cache.clear()
+
+    def reload_extension(self, name):
+        super().reload_extension(name)
+        self.help_cache.clear()
+
+    async def start(self, *args, **kwargs):
+        if self.metrics_port:
+            metrics.RateLimitMetrics.install()
+            port = self.metrics_port
+            if self.cluster:
+                port += self.cluster.cluster_id
+            await metrics.serve(os.environ.get("METRICS_HOST", "127.0.0.1"), port)
+        await self.storage.setup()
+        # Old server configs would break commands and voice events.
+        if await self.storage.needs_migration():
+            await self.storage.migrate()
+        # Loads while the gateway connects, voice events wait for it.
+        self.index_loaded = asyncio.ensure_future(self.load_state())
+        self.startup_timer.mark("storage")
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        self.deletions.stop()
+        await super().close()
+        # Not saved if the state never finished loading, it would be partial.
+        if (
+            self.snapshot is not None
+            and self.index_loaded is not None
+            and self.index_loaded.done()
+        ):
+            try:
+                await self.snapshot.save()
+            except OSError as e:
+                print(f"Failed to save snapshot {self.snapshot.path}. Error: {e}")
+        await self.storage.close()
+
+    async def load_state(self):
+        if self.snapshot is not None and await self.snapshot.restore():
+            return
+        await self.index.load(self.storage, self.owns_guild)
+
     async def get_server(self, server_id: int):
         server_id = str(server_id)
-        server = await self.servers.find_one({"_id": server_id})
-        if server is None:
-            await self.servers.find_one_and_update(
-                {"_id": server_id},
-                {"$set": {"channels": dict(), "autochannels": dict()}},
-                upsert=True,
-            )
-            server = await self.servers.find_one({"_id": server_id})
-        elif type(server["channels"]) is list:
-            await self.servers.find_one_and_update(
-                {"_id": server_id},
-                {
-                    "$set": {
-                        "channels": dict.fromkeys(map(str, server["channels"])),
-                        "autochannels": dict.fromkeys(map(str, server["autochannels"])),
-                    }
-                },
-                upsert=True,
-            )
-            server = await self.servers.find_one({"_id": server_id})
+        server = self.cache.get(server_id)
+        if server is not None:
+            return server
+        # A write while this read runs is newer, it isn't overwritten.
+        generation = self.cache.reading()
+        try:
+            server = await self.storage.get_server(server_id)
+            self.cache.fill(server_id, server, generation)
+        finally:
+            self.cache.done()
         return server
 
-    async def delete_channel(self, server_id: int, channel_id: int, channels: dict):
+    async def write_server(self, server_id: str, write):
+        try:
+            server = await write
+        except Exception:
+            self.cache.invalidate(server_id)
+            raise
+        self.cache.set(server_id, server)
+        return server
+
+    async def set_autochannel(self, server_id: int, channel_id: int, config):
+        server_id = str(server_id)
+        self.index.autochannels.add(int(channel_id))
+        return await self.write_server(
+            server_id,
+            self.storage.set_autochannel(server_id, str(channel_id), config),
+        )
+
+    async def delete_autochannels(self, server_id: int, channel_ids: list):
         server_id = str(server_id)
-        channels.pop(str(channel_id))
-        await self.servers.find_one_and_update(
-            {"_id": server_id}, {"$set": {"channels": channels}}, upsert=True,
+        self.index.autochannels.difference_update(map(int, channel_ids))
+        return await self.write_server(
+            server_id,
+            self.storage.delete_autochannels(server_id, list(map(str, channel_ids))),
         )
 
+    async def update_settings(self, server_id: int, settings: dict):
+        server_id = str(server_id)
+        return await self.write_server(
+            server_id, self.storage.update_settings(server_id, settings)
+        )
+
+    async def get_temp_channel(self, channel_id: int, fields: tuple = None):
+        return await self.storage.get_temp_channel(str(channel_id), fields)
+
+    async def add_temp_channel(
+        self,
+        server_id: int,
+        channel_id: int,
+        creator: int,
+        autochannel: int,
+        spare: bool = False,
+    ):
+        channel = {
+            "_id": str(channel_id),
+            "guild": str(server_id),
+            "creator": creator,
+            "autochannel": autochannel,
+        }
+        if spare:
+            channel["spare"] = True
+        self.index.temp_channels[int(channel_id)] = autochannel
+        await self.storage.add_temp_channel(channel)
+        if not spare:
+            metrics.temp_channels.inc(guild=channel["guild"])
+
+    async def claim_temp_channel(self, server_id: int, channel_id: int, creator: int):
+        await self.storage.claim_temp_channel(str(channel_id), creator)
+        metrics.temp_channels.inc(guild=str(server_id))
+
+    async def delete_channel(
+        self, channel_id: int, server_id: int = None, spare: bool = None
+    ):
+        """Returns whether the channel was a temp channel."""
+        autochannel = self.index.temp_channels.pop(int(channel_id), None)
+        if spare is None:
+            spare = self.pool.discard(autochannel, int(channel_id))
+        self.deletions.cancel(int(channel_id))
+        deleted = await self.storage.delete_temp_channel(str(channel_id))
+        if deleted and server_id is not None and not spare:
+            metrics.temp_channels.dec(guild=str(server_id))
+        return deleted
+
+    async def remove_temp_channel(self, channel: discord.VoiceChannel):
+        # The record is kept until the channel is gone, so a channel that failed
+        # to delete is still found by reconcile.
+        try:
+            with metrics.voice_phase.time(phase="delete"):
+                await self.rest.run(CHANNEL, channel_route(channel.id), channel.delete)
+        except discord.NotFound:
+            # Already deleted
+            pass
+        with metrics.voice_phase.time(phase="db_delete"):
+            await self.delete_channel(channel.id, channel.guild.id)
+
+    async def grace_for(self, server_id: int, channel_id: int) -> float:
+        """Seconds an empty temp channel is kept, set per autochannel."""
+        autochannel = self.index.temp_channels.get(channel_id)
+        if autochannel is None:
+            return self.grace_period
+        server = await self.get_server(server_id)
+        config = (server.get("autochannels") or {}).get(str(autochannel)) or {}
+        return config.get("grace", self.grace_period)
+
+    async def defer_deletion(self, channel: discord.VoiceChannel, grace: float):
+        # Armed before the write so a rejoin meanwhile still cancels it.
+        self.deletions.schedule(channel.id, grace, self.on_deletion_due)
+        await self.storage.set_temp_channel_expiry(
+            str(channel.id), time.time() + grace
+        )
+
+    def cancel_deletion(self, channel: discord.VoiceChannel):
+        """Keep an empty temp channel somebody joined during its grace period."""
+        if channel is not None and self.deletions.cancel(channel.id):
+            asyncio.ensure_future(self.storage.set_temp_channel_expiry(str(channel.id)))
+
+    def on_deletion_due(self, channel_id: int):
+        asyncio.ensure_future(self.expire_temp_channel(channel_id))
+
+    async def expire_temp_channel(self, channel_id: int):
+        if channel_id not in self.index.temp_channels:
+            return
+        channel = self.get_channel(channel_id)
+        try:
+            if channel is None:
+                # Deleted by someone else, on_guild_channel_delete removes it.
+                return
+            if len(channel.members) != 0:
+                await self.storage.set_temp_channel_expiry(str(channel_id))
+            else:
+                await self.remove_temp_channel(channel)
+        except Exception as e:
+            self.on_voice_error(e)
+
     async def on_ready(self):
         DiscordComponents(self)
         print("-" * 24)
@@ -94,15 +401,54 @@ class Sonus(commands.Bot):
         print(f"Bot version: {__version__}")
         print("-" * 24)
         print("I am logged in and ready!")
+        if not self.started:
+            self.startup_timer.mark("gateway")
+        memory = memory_stats(self)
+        print(
+            f"Using {memory['rss_mb']:.1f} MiB, {memory['per_1k_guilds_mb']:.1f} MiB "
+            f"per 1k guilds with {memory['cached_members']} cached members "
+            f"({memory['mode']} mode)."
+        )
+        if not self.started:
+            self.started = True
+            init_sentry()
+            self.load_cogs(self.deferred_cogs)
+            self.startup_timer.mark("deferred")
+            print(self.startup_timer.report())
+            await self.index_loaded
+            if self.pool.enabled:
+                await self.pool.load()
+                self.pool.reclaim.start()
+            self.deletions.start()
+            self.loop.create_task(reconcile(self))
+            self.collector.collect.start()
+            if self.snapshot is not None and self.snapshot.interval:
+                self.snapshot.autosave.start()
+        self.voice_dispatcher.start()
+        if self.cluster:
+            self.cluster.start(self)
         if not self.invite:
             self.invite = (
                 "https://discord.com/oauth2/authorize?client_id="
                 + str(self.user.id)
                 + "&permissions=285288464&scope=bot"
             )
+        if self.cache_watch and not self.cache.watching:
+            self.loop.create_task(self.storage.watch(self.cache))
         await self.update_status.start()
 
+    async def on_command(self, context):
+        context.started = time.perf_counter()
+
+    async def on_command_completion(self, context):
+        metrics.commands.observe(
+            time.perf_counter() - context.started,
+            command=context.command.qualified_name,
+        )
+
     async def on_command_error(self, context, exception):
+        if isinstance(exception, commands.CommandOnCooldown):
+            metrics.cooldowns.inc(command=context.command.qualified_name)
         if isinstance(exception, commands.CommandNotFound):
             await context.send(
                 f"Command not found. Use `@{context.me.display_name} help` for help."
@@ -141,82 +487,270 @@ class Sonus(commands.Bot):
         after: discord.VoiceState,
     ):
         await self.wait_until_ready()
-        server = await self.get_server(member.guild.id)
-        if before.channel:
-            if (
-                str(before.channel.id) in server["channels"]
-                and len(before.channel.members) == 0
-            ):
-                # left auto created channel with no more people
-                try:
-                    await before.channel.delete()
-                except discord.NotFound:
-                    # Already deleted
-                    pass
-                await self.delete_channel(
-                    member.guild.id, before.channel.id, server["channels"]
-                )
-        if after.channel:
-            if str(after.channel.id) in server["autochannels"]:
-                autochannel = after.channel.id
+        await self.index_loaded
+        if after.channel != before.channel:
+            self.cancel_deletion(after.channel)
+        if self.index.classify(before.channel, after.channel) == NOOP:
+            return
+        await self.voice_dispatcher.put(
+            member.guild.id, member, before.channel, after.channel
+        )
+
+    def on_voice_error(self, exception):
+        traceback.print_exception(
+            type(exception), exception, exception.__traceback__
+        )
+        import sentry_sdk
+
+        sentry_sdk.capture_exception(exception)
+
+    async def handle_voice_state(
+        self,
+        member: discord.Member,
+        before: discord.VoiceChannel,
+        after: discord.VoiceChannel,
+    ):
+        if (
+            before
+            and before.id in self.index.temp_channels
+            and len(before.members) == 0
+            and before.id not in self.deletions
+        ):
+            # left auto created channel with no more people
+            grace = await self.grace_for(member.guild.id, before.id)
+            if grace > 0:
+                await self.defer_deletion(before, grace)
+            else:
+                await self.remove_temp_channel(before)
+        if after and after.id in self.index.autochannels:
+            with metrics.voice_phase.time(phase="db_read"):
+                server = await self.get_server(member.guild.id)
+            if member.voice is None or member.voice.channel != after:
+                # Left again before the join was handled.
+                return
+            if str(after.id) in server["autochannels"]:
+                over_quota = self.quota.take(member.guild.id, member.id, server)
+                if over_quota is not None:
+                    return await self.over_quota(member, after, *over_quota)
+                autochannel = after.id
                 # joined creating channel
                 position_bottom = True
+                pool = False
                 if server["autochannels"][str(autochannel)]:
                     config = server["autochannels"][str(autochannel)]
 
                     position_bottom = config.get("positionbottom", True)
-                channel = await after.channel.clone(
-                    name="".join(
+                    pool = config.get("pool", False) and self.pool.enabled
+                name = (
+                    "".join(
                         letter
                         for letter in member.display_name
                         if letter not in string.punctuation and letter.isprintable()
                     )
                     + "'s voice call"
                 )
-                await channel.edit(position=after.channel.position + position_bottom)
+                position = after.position + position_bottom
+                channel = self.pool.take(after) if pool else None
+                spare = channel is not None
+                # REST calls made for this join by priority
+                calls = Counter()
+                if spare:
+                    # Rename and reveal the spare in one call. It was made at
+                    # the join position already, editing position would
+                    # reorder every channel of the guild in another call.
+                    with metrics.voice_phase.time(phase="reveal"):
+                        await self.rest.run(
+                            CHANNEL,
+                            channel_route(channel.id),
+                            lambda: channel.edit(name=name, overwrites=after.overwrites),
+                            calls=calls,
+                        )
+                else:
+                    with metrics.voice_phase.time(phase="create"):
+                        channel = await self.create_temp_channel(
+                            after, name, position, calls
+                        )
+                    # Indexed before the move so a quick leave isn't skipped.
+                    self.index.temp_channels[channel.id] = autochannel
+                if pool:
+                    self.pool.joined(after, position)
                 try:
-                    await member.move_to(channel)
+                    with metrics.voice_phase.time(phase="move"):
+                        await self.rest.run(
+                            MOVE,
+                            member_route(member.guild.id),
+                            lambda: member.move_to(channel),
+                            calls=calls,
+                        )
                 except:
-                    return await channel.delete()
-                server["channels"][str(channel.id)] = {
-                    "creator": member.id,
-                    "autochannel": autochannel,
-                }
-                await self.servers.find_one_and_update(
-                    {"_id": str(member.guild.id)},
-                    {"$set": {"channels": server["channels"]}},
-                    upsert=True,
+                    if spare:
+                        await self.delete_channel(
+                            channel.id, member.guild.id, spare=True
+                        )
+                    else:
+                        self.index.temp_channels.pop(channel.id, None)
+                    try:
+                        return await self.rest.run(
+                            CHANNEL,
+                            channel_route(channel.id),
+                            channel.delete,
+                            calls=calls,
+                        )
+                    finally:
+                        self.join_calls[sum(calls.values())] += 1
+                self.join_calls[sum(calls.values())] += 1
+                self.quota.created(member.guild.id, member.id, channel.id)
+                with metrics.voice_phase.time(phase="db_write"):
+                    if spare:
+                        await self.claim_temp_channel(
+                            member.guild.id, channel.id, member.id
+                        )
+                    else:
+                        await self.add_temp_channel(
+                            member.guild.id, channel.id, member.id, autochannel
+                        )
+
+    async def over_quota(
+        self,
+        member: discord.Member,
+        autochannel: discord.VoiceChannel,
+        scope: str,
+        wait: float,
+    ):
+        # Back to their last channel if it's still there, else wait for the quota.
+        channel = member.guild.get_channel(
+            self.quota.last_channel(member.guild.id, member.id) or 0
+        )
+        if channel is not None and channel.id in self.index.temp_channels:
+            metrics.churn_limited.inc(scope=scope, action="reuse")
+            try:
+                await self.rest.run(
+                    MOVE, member_route(member.guild.id), lambda: member.move_to(channel)
                 )
+            except discord.HTTPException:
+                pass
+            return
+        key = (member.guild.id, member.id)
+        if wait > self.quota_max_wait or key in self.quota.waiting:
+            metrics.churn_limited.inc(scope=scope, action="drop")
+            return
+        metrics.churn_limited.inc(scope=scope, action="queue")
+        self.quota.waiting.add(key)
+        self.loop.call_later(wait, self.retry_join, member, autochannel)
 
-    async def on_guild_channel_delete(self, channel):
-        server = await self.get_server(channel.guild.id)
-        if channel.id in server["autochannels"]:
-            del server["autochannels"][str(channel.id)]
-            await self.servers.find_one_and_update(
-                {"_id": str(channel.guild.id)},
-                {"$set": {"autochannels": server["autochannels"]}},
-                upsert=True,
+    def retry_join(self, member: discord.Member, autochannel: discord.VoiceChannel):
+        self.quota.waiting.discard((member.guild.id, member.id))
+        # Only if they're still waiting in the autochannel
+        if member.voice is not None and member.voice.channel == autochannel:
+            asyncio.ensure_future(
+                self.voice_dispatcher.put(member.guild.id, member, None, autochannel)
             )
 
+    async def create_temp_channel(
+        self,
+        autochannel: discord.VoiceChannel,
+        name: str,
+        position: int,
+        calls: Counter = None,
+    ):
+        # Everything clone would copy and the position in one request.
+        return await self.rest.run(
+            CHANNEL,
+            guild_channels_route(autochannel.guild.id),
+            lambda: autochannel.guild.create_voice_channel(
+                name,
+                category=autochannel.category,
+                position=position,
+                bitrate=autochannel.bitrate,
+                user_limit=autochannel.user_limit,
+                rtc_region=autochannel.rtc_region,
+                overwrites=autochannel.overwrites,
+            ),
+            calls=calls,
+        )
+
+    @property
+    def total_guilds(self) -> int:
+        if self.cluster and self.cluster.guilds is not None:
+            return self.cluster.guilds
+        return len(self.guilds)
+
+    def owns_guild(self, guild_id: int) -> bool:
+        if self.shard_ids is None:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    async def on_shard_connect(self, shard_id: int):
+        self.shard_connect_times[shard_id] = time.perf_counter()
+        print(f"Shard {shard_id} connected.")
+
+    async def on_shard_ready(self, shard_id: int):
+        took = time.perf_counter() - self.shard_connect_times.get(shard_id, 0)
+        guilds = sum(1 for guild in self.guilds if guild.shard_id == shard_id)
+        print(f"Shard {shard_id} ready with {guilds} servers in {took:.2f}s.")
+
+    async def on_shard_disconnect(self, shard_id: int):
+        self.shard_connect_times[shard_id] = time.perf_counter()
+        print(f"Shard {shard_id} disconnected.")
+
+    async def on_shard_resumed(self, shard_id: int):
+        took = time.perf_counter() - self.shard_connect_times.get(shard_id, 0)
+        print(f"Shard {shard_id} resumed in {took:.2f}s.")
+
+    async def on_guild_available(self, guild):
+        if guild.id in self.unreconciled and self.reconcile_later is None:
+            # Servers tend to come back together after an outage, wait for the
+            # rest so the stored records are read once for all of them.
+            self.reconcile_later = self.loop.call_later(10, self.reconcile_available)
+
+    def reconcile_available(self):
+        self.reconcile_later = None
+        guild_ids = set()
+        for guild_id in list(self.unreconciled):
+            guild = self.get_guild(guild_id)
+            if guild is None or not guild.unavailable:
+                # Servers that were left are cleaned up by the collector.
+                self.unreconciled.discard(guild_id)
+            if guild is not None and not guild.unavailable:
+                guild_ids.add(guild_id)
+        if guild_ids:
+            self.loop.create_task(reconcile(self, guild_ids))
+
+    async def on_guild_channel_delete(self, channel):
+        if not isinstance(channel, discord.VoiceChannel):
+            return
+        await self.index_loaded
+        if channel.id in self.index.temp_channels:
+            await self.delete_channel(channel.id, channel.guild.id)
+        elif channel.id in self.index.autochannels:
+            await self.delete_autochannels(channel.guild.id, [channel.id])
+
     @tasks.loop(minutes=2)
     async def update_status(self):
-        await self.change_presence(
-            activity=discord.Game(
-                "@"
-                + self.user.name
-                + " help | v"
-                + __version__
-                + " | "
-                + str(len(self.guilds))
-                + " servers"
+        for shard_id in self.shards:
+            await self.change_presence(
+                activity=discord.Game(
+                    "@"
+                    + self.user.name
+                    + " help | v"
+                    + __version__
+                    + " | "
+                    + str(self.total_guilds)
+                    + " servers | shard "
+                    + str(shard_id)
+                ),
+                shard_id=shard_id,
             )
-        )
 
 
-bot = Sonus()
+def main(**kwargs):
+    token = os.environ.get("TOKEN", None)
+    if token is None or len(token.strip()) == 0:
+        print("\nA bot token is necessary for the bot to function.\n")
+        raise RuntimeError
+    bot = Sonus(**kwargs)
+    bot.run(token)
+
 
-token = os.environ.get("TOKEN", None)
-if token is None or len(token.strip()) == 0:
-    print("\nA bot token is necessary for the bot to function.\n")
-    raise RuntimeError
-bot.run(token)
+if __name__ == "__main__":
+    main()
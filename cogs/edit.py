@@ -1,14 +1,52 @@
-import discord
 from discord.ext import commands
 from discord.ext.commands import Context
 
 from core.checks import is_channel_owner
+from core.converters import MemberConverter
+from core.scheduler import EDIT, MOVE, channel_route, member_route
+
+SUPERSEDED = "Superseded by a newer edit."
 
 
 class Edit(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def edit_channel(self, ctx: Context, **options) -> bool:
+        """Returns False if a newer edit of the same options replaced this one."""
+        # A queued edit of the same option is replaced by the newer one.
+        channel = ctx.author.voice.channel
+
+        async def edit():
+            await channel.edit(**options)
+            return True
+
+        return (
+            await self.bot.rest.run(
+                EDIT, channel_route(channel.id), edit, key=(channel.id, *options)
+            )
+            is not None
+        )
+
+    async def set_permissions(self, ctx: Context, user, **options) -> bool:
+        """Returns False if a newer ban or unban of the user replaced this one."""
+        # A queued ban or unban of the same user is replaced by the newer one.
+        channel = ctx.author.voice.channel
+
+        async def edit():
+            await channel.set_permissions(user, **options)
+            return True
+
+        return (
+            await self.bot.rest.run(
+                EDIT,
+                channel_route(channel.id),
+                edit,
+                key=(channel.id, "permissions", user.id),
+            )
+            is not None
+        )
+
     @commands.command(aliases=["name", "n"])
     @commands.cooldown(1, 10, commands.BucketType.member)
     @is_channel_owner()
@@ -21,7 +59,8 @@ class Edit(commands.Cog):
         {prefix}rename cool
         """
         try:
-            await ctx.author.voice.channel.edit(name=name)
+            if not await self.edit_channel(ctx, name=name):
+                return await ctx.send(SUPERSEDED)
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
         await ctx.send(f"Renamed channel to `{name}`.")
@@ -45,7 +84,8 @@ class Edit(commands.Cog):
         if limit == 0 and ctx.author.voice.channel.user_limit == 0:
             limit = len(ctx.author.voice.channel.members)
         try:
-            await ctx.author.voice.channel.edit(user_limit=limit)
+            if not await self.edit_channel(ctx, user_limit=limit):
+                return await ctx.send(SUPERSEDED)
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
         await ctx.send(f"Changed limit to `{limit}`.")
@@ -64,7 +104,8 @@ class Edit(commands.Cog):
         if rate < 8 or rate > 96:
             return await ctx.send("Limit has to be from 8-96kbps.")
         try:
-            await ctx.author.voice.channel.edit(bitrate=rate * 1000)
+            if not await self.edit_channel(ctx, bitrate=rate * 1000):
+                return await ctx.send(SUPERSEDED)
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
         await ctx.send(f"Changed bitrate to `{rate}` kbps.")
@@ -73,7 +114,7 @@ class Edit(commands.Cog):
     @commands.cooldown(1, 10, commands.BucketType.member)
     @is_channel_owner()
     @commands.guild_only()
-    async def ban(self, ctx: Context, *, user: discord.Member):
+    async def ban(self, ctx: Context, *, user: MemberConverter):
         """
         Remove's join permissions and kicks out a user.
         ~
@@ -82,14 +123,20 @@ class Edit(commands.Cog):
         """
         name = user.name + "#" + user.discriminator
         try:
-            await ctx.author.voice.channel.set_permissions(
-                user, connect=False, reason=f"Banned from voice channel by {name}.",
-            )
+            if not await self.set_permissions(
+                ctx, user, connect=False, reason=f"Banned from voice channel by {name}."
+            ):
+                # The newer ban or unban of this user decides, so no kick.
+                return await ctx.send(SUPERSEDED)
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
         try:
-            await user.edit(
-                voice_channel=None, reason="Kicked from voice channel by {name}."
+            await self.bot.rest.run(
+                MOVE,
+                member_route(ctx.guild.id),
+                lambda: user.edit(
+                    voice_channel=None, reason="Kicked from voice channel by {name}."
+                ),
             )
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
@@ -99,7 +146,7 @@ class Edit(commands.Cog):
     @commands.cooldown(1, 10, commands.BucketType.member)
     @is_channel_owner()
     @commands.guild_only()
-    async def unban(self, ctx: Context, *, user: discord.Member):
+    async def unban(self, ctx: Context, *, user: MemberConverter):
         """
         Unbans a user from joining the channel.
         ~
@@ -108,9 +155,10 @@ class Edit(commands.Cog):
         """
         name = user.name + "#" + user.discriminator
         try:
-            await ctx.author.voice.channel.set_permissions(
-                user, connect=None, reason=f"Unbanned from voice channel by {name}.",
-            )
+            if not await self.set_permissions(
+                ctx, user, connect=None, reason=f"Unbanned from voice channel by {name}."
+            ):
+                return await ctx.send(SUPERSEDED)
         except Exception as e:
             return await ctx.send("An error occured: " + str(e))
         await ctx.send(f"Unbanned {name}.")
@@ -1,20 +1,36 @@
-import asyncio
 import inspect
+import itertools
 import os
 from datetime import datetime
-from difflib import get_close_matches
 
 import discord
 from discord.ext import commands
 from discord.ext.commands import Context
 from discord_components import ButtonStyle, Button
-from humanize import precisedelta
 
-from bot import __version__
+from core.fuzzy import BKTree
+from core.version import __version__
 
 
 class SonusHelpCommand(commands.HelpCommand):
+    # Help commands are copied for every invoke, so the built embeds live in
+    # bot.help_cache, which is cleared whenever an extension is (un)loaded.
+
+    def cached(self, key: tuple, build):
+        cache = self.context.bot.help_cache
+        value = cache.get(key)
+        if value is None:
+            if len(cache) >= 1000:
+                # Prefixes include server nicknames, don't keep every one forever.
+                cache.clear()
+            value = cache[key] = build()
+        return value
+
     async def send_bot_help(self, mapping):
+        embed = self.cached(("bot", self.clean_prefix), self.build_bot_help)
+        await self.get_destination().send(embed=embed)
+
+    def build_bot_help(self):
         bot = self.context.bot
 
         cogs = [bot.get_cog("Setup"), bot.get_cog("Edit"), bot.get_cog("Misc")]
@@ -40,17 +56,21 @@ class SonusHelpCommand(commands.HelpCommand):
             help_embed.add_field(
                 name=cog_command[0].cog_name, value=value, inline=False
             )
-        await self.get_destination().send(embed=help_embed)
+        return help_embed
 
     async def send_command_help(self, command):
+        embed = self.cached(
+            ("command", command.qualified_name, self.clean_prefix),
+            lambda: self.build_command_help(command),
+        )
+        await self.get_destination().send(embed=embed)
+
+    def build_command_help(self, command):
         bot = self.context.bot
 
         help_embed = discord.Embed()
         help_embed.set_author(name=bot.user, icon_url=bot.user.avatar_url)
         help_embed.colour = 2228207
-        help_embed.set_footer(
-            text=f"Use {self.clean_prefix}help [command] to get help for a specific command."
-        )
 
         help_embed.title = (
             f"{self.clean_prefix}{command.qualified_name} {command.signature}"
@@ -86,19 +106,13 @@ class SonusHelpCommand(commands.HelpCommand):
             + "\n"
             + "[]'s are optional arguments. <>'s are required arguments."
         )
-        await self.get_destination().send(embed=help_embed)
+        return help_embed
 
     async def send_error_message(self, error):
         command = self.context.kwargs.get("command")
-        command_names = set()
-        for cmd in self.context.bot.walk_commands():
-            if not cmd.hidden:
-                command_names.add(cmd.qualified_name)
-                for alias in cmd.aliases:
-                    command_names.add(alias)
-        closest = get_close_matches(command, command_names, 2)
-        if not closest:
-            closest = get_close_matches(command, command_names, 1, 0)
+        index = self.cached(("index",), self.build_index)
+        # Close matches if there are any, otherwise the single closest command.
+        closest = index.close_matches(command, 2) or index.close_matches(command, 1, 0)
         closest = "` or `".join(closest)
         embed = discord.Embed(
             description=f"Command `{command}` not found. Did you mean `{closest}`?"
@@ -106,6 +120,15 @@ class SonusHelpCommand(commands.HelpCommand):
         embed.colour = 2228207
         await self.get_destination().send(embed=embed)
 
+    def build_index(self):
+        command_names = set()
+        for cmd in self.context.bot.walk_commands():
+            if not cmd.hidden:
+                command_names.add(cmd.qualified_name)
+                for alias in cmd.aliases:
+                    command_names.add(alias)
+        return BKTree(sorted(command_names))
+
 
 class Misc(commands.Cog):
     def __init__(self, bot):
@@ -122,6 +145,12 @@ class Misc(commands.Cog):
             },
         )
         self.bot.help_command.cog = self
+        # command callback -> source pages, built once. Commands of cogs loaded
+        # later are added on first use and reloaded commands get new callbacks.
+        self.sources = {
+            command.callback: self.source_pages(command)
+            for command in itertools.chain(bot.walk_commands(), self.walk_commands())
+        }
 
     @commands.command(aliases=["who", "what", "when", "where", "why"])
     @commands.cooldown(1, 4, commands.BucketType.member)
@@ -137,10 +166,13 @@ class Misc(commands.Cog):
         )
         embed.colour = 2228207
         embed.add_field(name="Version", value="v" + __version__)
-        embed.add_field(name="Servers", value=len(self.bot.guilds), inline=True)
+        embed.add_field(name="Servers", value=self.bot.total_guilds, inline=True)
         embed.add_field(
             name="Latency", value="{:.3f}ms".format(self.bot.latency * 1000)
         )
+        # Imported here to keep it off the startup path.
+        from humanize import precisedelta
+
         embed.add_field(
             name="Uptime", value=precisedelta(datetime.now() - self.bot.startup)
         )
@@ -207,9 +239,22 @@ class Misc(commands.Cog):
         if obj is None:
             return await ctx.send("Command not found!")
 
+        pages = self.sources.get(obj.callback)
+        if pages is None:
+            pages = self.sources[obj.callback] = self.source_pages(obj)
+        # The bot's name isn't known when the pages are built.
+        title = f"Source code of {prefix}{obj.qualified_name}."
+        pages = [page.copy() for page in pages]
+        for page in pages:
+            page.title = title
+        await self.bot.paginator.send(ctx, pages)
+
+    @staticmethod
+    def source_pages(obj) -> list:
+        source_url = "https://github.com/RealCyGuy/Sonus"
         src = obj.callback.__code__
         lines, file_start = inspect.getsourcelines(src)
-        sourcecode = inspect.getsource(src).replace("```", "")
+        sourcecode = "".join(lines).replace("```", "")
         if obj.callback.__module__.startswith("discord"):
             location = obj.callback.__module__.replace(".", "/") + ".py"
             source_url = "https://github.com/Rapptz/discord.py"
@@ -218,9 +263,7 @@ class Misc(commands.Cog):
             location = os.path.relpath(src.co_filename).replace("\\", "/")
             branch = "main"
 
-        embed = discord.Embed(
-            title=f"Source code of {prefix}{command}.", colour=2228207
-        )
+        embed = discord.Embed(colour=2228207)
 
         sourcecode = sourcecode.splitlines(True)
         for index, line in enumerate(sourcecode):
@@ -244,51 +287,9 @@ class Misc(commands.Cog):
                     pages.append(page)
                     msg = "```py\n"
             msg += line
-        message = await ctx.send(
-            embed=pages[0].copy().set_footer(text="1/" + str(len(pages)) + " pages")
-        )
-        reactions = ["◀", "▶"]
-        for re in reactions:
-            await message.add_reaction(re)
-
-        def check(r, u):
-            return r.message.id == message.id and u == ctx.author
-
-        page = 0
-        while True:
-            try:
-                reaction, _ = await self.bot.wait_for(
-                    "reaction_add", timeout=60.0, check=check
-                )
-                if reaction.emoji in reactions:
-                    reaction_index = -1
-                    if reaction.emoji == reactions[0] and page > 0:
-                        page -= 1
-                        reaction_index = 0
-                    if reaction.emoji == reactions[1] and page < len(pages) - 1:
-                        page += 1
-                        reaction_index = 1
-                    if reaction_index >= 0:
-                        await message.edit(
-                            embed=pages[page]
-                            .copy()
-                            .set_footer(
-                                text=str(page + 1) + "/" + str(len(pages)) + " pages"
-                            )
-                        )
-                        try:
-                            await message.remove_reaction(
-                                reactions[reaction_index], ctx.author
-                            )
-                        except discord.Forbidden:
-                            pass
-            except asyncio.TimeoutError:
-                for re in reactions:
-                    await message.remove_reaction(re, self.bot.user)
-                    try:
-                        await message.remove_reaction(re, ctx.author)
-                    except discord.Forbidden:
-                        pass
+        for number, page in enumerate(pages, 1):
+            page.set_footer(text=f"{number}/{len(pages)} pages")
+        return pages
 
 
 def setup(bot):
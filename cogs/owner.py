@@ -0,0 +1,94 @@
+import discord
+from discord.ext import commands
+from discord.ext.commands import Context
+
+from core.memory import memory_stats
+from core.migrations import SCHEMA_VERSION
+from core.storage import WriteBehindStorage
+
+
+class Owner(commands.Cog, command_attrs=dict(hidden=True)):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_check(self, ctx: Context):
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.command()
+    async def migrate(self, ctx: Context):
+        """
+        Upgrade server configs to the latest schema.
+        ~
+        {prefix}migrate
+        """
+        message = await ctx.send("Migrating servers...")
+        migrated = await self.bot.storage.migrate()
+        # Cached configs may be from before the migration.
+        self.bot.cache.clear()
+        await message.edit(
+            content=f"Migrated {migrated} servers to schema v{SCHEMA_VERSION}."
+        )
+
+    @commands.command()
+    async def stats(self, ctx: Context):
+        """
+        Show internal cache and queue stats.
+        ~
+        {prefix}stats
+        """
+        embed = discord.Embed(title="Sonus Stats", colour=2228207)
+        embed.add_field(
+            name="Startup", value=format_stats(self.bot.startup_timer.stats())
+        )
+        embed.add_field(name="Memory", value=format_stats(memory_stats(self.bot)))
+        if isinstance(self.bot.storage, WriteBehindStorage):
+            embed.add_field(
+                name="Write Behind", value=format_stats(self.bot.storage.stats())
+            )
+        embed.add_field(name="Server Cache", value=format_stats(self.bot.cache.stats()))
+        embed.add_field(
+            name="Voice Queue", value=format_stats(self.bot.voice_dispatcher.stats())
+        )
+        embed.add_field(name="Channel Index", value=format_stats(self.bot.index.stats()))
+        embed.add_field(name="Spare Channels", value=format_stats(self.bot.pool.stats()))
+        embed.add_field(
+            name="Pending Deletions", value=format_stats(self.bot.deletions.stats())
+        )
+        embed.add_field(
+            name="Garbage Collector", value=format_stats(self.bot.collector.stats())
+        )
+        embed.add_field(name="REST Scheduler", value=format_stats(self.bot.rest.stats()))
+        embed.add_field(name="Churn Quotas", value=format_stats(self.bot.quota.stats()))
+        embed.add_field(name="Paginators", value=format_stats(self.bot.paginator.stats()))
+        if self.bot.snapshot is not None:
+            embed.add_field(
+                name="Snapshot", value=format_stats(self.bot.snapshot.stats())
+            )
+        joins = sum(self.bot.join_calls.values())
+        calls = sum(n * count for n, count in self.bot.join_calls.items())
+        embed.add_field(
+            name="Join REST Calls",
+            value=format_stats(
+                {
+                    "joins": joins,
+                    "calls": calls,
+                    "per_join": calls / joins if joins else 0.0,
+                    **{
+                        f"{n}_calls": count
+                        for n, count in sorted(self.bot.join_calls.items())
+                    },
+                }
+            ),
+        )
+        await ctx.send(embed=embed)
+
+
+def format_stats(stats: dict) -> str:
+    return "\n".join(
+        f"{key}: `{value:.3f}`" if type(value) is float else f"{key}: `{value}`"
+        for key, value in stats.items()
+    )
+
+
+def setup(bot):
+    bot.add_cog(Owner(bot))
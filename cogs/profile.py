@@ -0,0 +1,184 @@
+import asyncio
+import io
+import threading
+import time
+
+import discord
+from discord.ext import commands
+from discord.ext.commands import Context
+
+from cogs.owner import format_stats
+from core.profiler import (
+    FunctionProfiler,
+    LagMonitor,
+    StackSampler,
+    measure_lag,
+    task_counts,
+)
+
+MAX_SECONDS = 300
+
+
+class Profile(commands.Cog, command_attrs=dict(hidden=True)):
+    def __init__(self, bot):
+        self.bot = bot
+        self.running = False
+
+    async def cog_check(self, ctx: Context):
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.group(invoke_without_command=True)
+    async def profile(self, ctx: Context):
+        """
+        Profile the bot while it's running.
+        ~
+        {prefix}profile
+        {prefix}profile lag 10
+        {prefix}profile sample 30
+        {prefix}profile cprofile 60 on_voice_state_update 100
+        """
+        await ctx.send_help(ctx.command)
+
+    @profile.command()
+    async def lag(self, ctx: Context, seconds: float = 5):
+        """
+        Measure event loop lag and count running tasks.
+        ~
+        {prefix}profile lag
+        {prefix}profile lag 10
+        """
+        seconds = min(seconds, MAX_SECONDS)
+        async with ctx.typing():
+            lag = await measure_lag(seconds)
+        await ctx.send(embed=self.summary(f"Loop lag over {seconds:g}s", lag))
+
+    @profile.command()
+    async def sample(
+        self, ctx: Context, seconds: float = 10, target: str = None, events: int = 0
+    ):
+        """
+        Sample stacks of the event loop and upload them collapsed for flamegraphs.
+        Give a command or event to stop after that many of them ran.
+        ~
+        {prefix}profile sample 30
+        {prefix}profile sample 60 rename 5
+        """
+        sampler = StackSampler(threading.get_ident())
+        embed = await self.run(ctx, sampler, seconds, target, events)
+        if embed is None:
+            return
+        embed.add_field(
+            name="Top Functions",
+            value="\n".join(
+                f"`{share:6.1%}` {function}" for function, share in sampler.top()
+            )
+            or "No samples.",
+            inline=False,
+        )
+        await ctx.send(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO(sampler.collapsed().encode()), filename="profile.collapsed"
+            ),
+        )
+
+    @profile.command()
+    async def cprofile(
+        self, ctx: Context, seconds: float = 10, target: str = None, events: int = 0
+    ):
+        """
+        Run cProfile on the event loop and upload the sorted stats.
+        Give a command or event to stop after that many of them ran.
+        ~
+        {prefix}profile cprofile 30
+        {prefix}profile cprofile 60 on_voice_state_update 100
+        """
+        profiler = FunctionProfiler()
+        embed = await self.run(ctx, profiler, seconds, target, events)
+        if embed is None:
+            return
+        await ctx.send(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO(profiler.report().encode()), filename="profile.txt"
+            ),
+        )
+
+    async def run(self, ctx: Context, profiler, seconds: float, target: str, events: int):
+        """Runs ``profiler`` for the window and returns a summary embed."""
+        if self.running:
+            await ctx.send("A profile is already running.")
+            return None
+        seconds = min(seconds, MAX_SECONDS)
+        if target is not None:
+            listener = self.target_listener(target)
+            if listener is None:
+                await ctx.send(f"`{target}` is not a command or event.")
+                return None
+            event, check = listener
+        done = asyncio.Event()
+        seen = 0
+
+        async def count(*args):
+            nonlocal seen
+            if check(*args):
+                seen += 1
+                if events and seen >= events:
+                    done.set()
+
+        if target is not None:
+            self.bot.add_listener(count, event)
+        monitor = LagMonitor()
+        self.running = True
+        start = time.perf_counter()
+        profiler.start()
+        monitor.start()
+        try:
+            if target is not None and events:
+                await ctx.send(
+                    f"Profiling the next {events} `{target}` for up to {seconds:g}s..."
+                )
+            else:
+                await ctx.send(f"Profiling for {seconds:g}s...")
+            try:
+                await asyncio.wait_for(done.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            profiler.stop()
+            monitor.stop()
+            elapsed = time.perf_counter() - start
+            self.running = False
+            if target is not None:
+                self.bot.remove_listener(count, event)
+        embed = self.summary(f"Profiled {elapsed:.2f}s", monitor.stats())
+        if target is not None:
+            embed.description = f"{seen} `{target}` ran while profiling."
+        return embed
+
+    def target_listener(self, target: str):
+        """The event to listen to and a check counting ``target``."""
+        if target.startswith("on_"):
+            return target, lambda *args: True
+        command = self.bot.get_command(target)
+        if command is None:
+            return None
+        return (
+            "on_command_completion",
+            lambda ctx: ctx.command.qualified_name == command.qualified_name,
+        )
+
+    @staticmethod
+    def summary(title: str, lag: dict) -> discord.Embed:
+        embed = discord.Embed(title=title, colour=2228207)
+        embed.add_field(name="Loop Lag", value=format_stats(lag))
+        tasks = task_counts()
+        embed.add_field(
+            name=f"Tasks ({sum(tasks.values())})",
+            value=format_stats(dict(tasks.most_common(10))),
+        )
+        return embed
+
+
+def setup(bot):
+    bot.add_cog(Profile(bot))
@@ -6,6 +6,30 @@ class Setup(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def autochannel_config(self, ctx: Context):
+        """
+        The id and a copy of the config of the autochannel that made the
+        author's channel, or None after telling them why it wasn't found.
+        """
+        if not ctx.author.voice:
+            await ctx.send("You have to be in a voice channel to use this command.")
+            return None
+        channel = await self.bot.get_temp_channel(
+            ctx.author.voice.channel.id, ("autochannel",)
+        )
+        if channel is None:
+            await ctx.send(
+                "You have to be in a voice channel created by me to use this command."
+            )
+            return None
+        server = await self.bot.get_server(ctx.guild.id)
+        try:
+            autochannel = server["autochannels"][str(channel["autochannel"])]
+        except:
+            await ctx.send("Original auto channel not found.")
+            return None
+        return channel["autochannel"], dict(autochannel or {})
+
     @commands.command(aliases=["start"])
     @commands.has_permissions(manage_guild=True)
     @commands.guild_only()
@@ -17,14 +41,8 @@ class Setup(commands.Cog):
         ~
         {prefix}create
         """
-        server = await self.bot.get_server(ctx.guild.id)
         channel = await ctx.guild.create_voice_channel("start vc!")
-        server["autochannels"][str(channel.id)] = None
-        await self.bot.servers.find_one_and_update(
-            {"_id": str(ctx.guild.id)},
-            {"$set": {"autochannels": server["autochannels"]}},
-            upsert=True,
-        )
+        await self.bot.set_autochannel(ctx.guild.id, channel.id, None)
         await ctx.send(
             f"Created voice channel with an id of `{channel.id}`. You can rename and move it and I'll automatically create voice channels!"
         )
@@ -40,38 +58,104 @@ class Setup(commands.Cog):
         ~
         {prefix}toggleposition
         """
-        if not ctx.author.voice:
-            return await ctx.send(
-                "You have to be in a voice channel to use this command."
-            )
+        found = await self.autochannel_config(ctx)
+        if found is None:
+            return
+        autochannel_id, config = found
+        position_bottom = config.get("positionbottom", True)
+        config["positionbottom"] = not position_bottom
+
+        await self.bot.set_autochannel(ctx.guild.id, autochannel_id, config)
+
+        await ctx.send(
+            f"Set <#{autochannel_id}>'s future channels to spawn on the {'bottom' if position_bottom else 'top'}."
+        )
+
+    @commands.command(aliases=["pool"])
+    @commands.has_permissions(manage_guild=True)
+    @commands.guild_only()
+    async def togglepool(self, ctx: Context):
+        """
+        Keep hidden spare channels ready for faster joins.
+
+        You have to be in a channel created by the auto voice channel you want to change. The number of spares follows how busy the auto voice channel is and unused spares are deleted after a while.
+        ~
+        {prefix}togglepool
+        """
+        if not self.bot.pool.enabled:
+            return await ctx.send("Spare channels are turned off for this bot.")
+        found = await self.autochannel_config(ctx)
+        if found is None:
+            return
+        autochannel_id, config = found
+        pool = config.get("pool", False)
+        config["pool"] = not pool
+
+        await self.bot.set_autochannel(ctx.guild.id, autochannel_id, config)
+
+        await ctx.send(
+            f"Turned {'off' if pool else 'on'} spare channels for <#{autochannel_id}>."
+        )
+
+    @commands.command(aliases=["grace"])
+    @commands.has_permissions(manage_guild=True)
+    @commands.guild_only()
+    async def graceperiod(self, ctx: Context, seconds: int = None):
+        """
+        Keep empty channels for a while before deleting them.
+
+        You have to be in a channel created by the auto voice channel you want to change. Channels are kept for up to an hour so people can rejoin after a connection drop, leave it empty to use the default.
+        ~
+        {prefix}graceperiod [seconds]
+        """
+        if seconds is not None and not 0 <= seconds <= 3600:
+            return await ctx.send("The grace period has to be 0 to 3600 seconds.")
+        found = await self.autochannel_config(ctx)
+        if found is None:
+            return
+        autochannel_id, config = found
+        if seconds is None:
+            config.pop("grace", None)
+        else:
+            config["grace"] = seconds
+
+        await self.bot.set_autochannel(ctx.guild.id, autochannel_id, config)
+
+        grace = self.bot.grace_period if seconds is None else seconds
+        await ctx.send(
+            f"Empty channels from <#{autochannel_id}> will be deleted after {grace:g} seconds."
+        )
+
+    @commands.command(aliases=["churn"])
+    @commands.has_permissions(manage_guild=True)
+    @commands.guild_only()
+    async def quota(self, ctx: Context, per_member: int = None, per_server: int = None):
+        """
+        Limit how many channels can be made a minute.
+
+        Stops people from joining and leaving over and over to spam channels. Members over the limit are moved back to the last channel they made or wait in the auto voice channel until they can make another. 0 turns a limit off, leave both empty to see the current limits.
+        ~
+        {prefix}quota [per member] [per server]
+        """
         server = await self.bot.get_server(ctx.guild.id)
-        try:
-            channel = server["channels"][str(ctx.author.voice.channel.id)]
-        except KeyError:
+        if per_member is None:
+            limits = self.bot.quota.limits(server)
             return await ctx.send(
-                "You have to be in a voice channel created by me to use this command."
+                f"Members can make {limits['member'] or 'unlimited'} and the server can make {limits['guild'] or 'unlimited'} channels a minute."
             )
-        try:
-            autochannel = server["autochannels"][str(channel["autochannel"])]
-        except:
-            return await ctx.send("Original auto channel not found.")
-        position_bottom = True
-        if autochannel:
-            position_bottom = autochannel.get("positionbottom", True)
-        else:
-            server["autochannels"][str(channel["autochannel"])] = {}
-        server["autochannels"][str(channel["autochannel"])][
-            "positionbottom"
-        ] = not position_bottom
-
-        await self.bot.servers.find_one_and_update(
-            {"_id": str(ctx.guild.id)},
-            {"$set": {"autochannels": server["autochannels"]}},
-            upsert=True,
-        )
+        limits = [per_member, per_server]
+        if any(limit is not None and not 0 <= limit <= 60 for limit in limits):
+            return await ctx.send("Limits have to be 0 to 60 channels a minute.")
+        quota = dict(server.get("quota") or {})
+        quota["member"] = per_member
+        if per_server is not None:
+            quota["guild"] = per_server
+
+        await self.bot.update_settings(ctx.guild.id, {"quota": quota})
 
+        limits = self.bot.quota.limits({"quota": quota})
         await ctx.send(
-            f"Set <#{channel['autochannel']}>'s future channels to spawn on the {'bottom' if position_bottom else 'top'}."
+            f"Members can now make {limits['member'] or 'unlimited'} and the server can make {limits['guild'] or 'unlimited'} channels a minute."
         )
 
 
@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+
+
+class GuildCache:
+    """
+    Bounded LRU cache of ``servers`` documents with a time to live.
+
+    Entries are filled on first access and replaced by every write, so reads
+    after a write never go back to mongodb. Reads from mongodb are filled in
+    with ``fill`` and dropped if the key was written while they were running,
+    the write is newer.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.watching = False
+        # Bumped by every write
+        self.generation = 0
+        # Reads that haven't been filled in yet
+        self.reads = 0
+        # key -> generation it was last written at, while reads are running
+        self._written = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, document = entry
+        if self.ttl and expires < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return document
+
+    def peek(self, key: str):
+        """Like ``get`` without counting or refreshing the entry, even if expired."""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def items(self) -> list:
+        """Unexpired ``(key, document)`` pairs, least recently used first."""
+        now = time.monotonic()
+        return [
+            (key, document)
+            for key, (expires, document) in self._entries.items()
+            if not self.ttl or expires >= now
+        ]
+
+    def _write(self, key: str):
+        self.generation += 1
+        if self.reads:
+            self._written[key] = self.generation
+
+    def reading(self) -> int:
+        """Start a read to ``fill`` in later, call ``done`` once it's over."""
+        self.reads += 1
+        return self.generation
+
+    def stale(self, key: str, generation: int) -> bool:
+        """Whether ``key`` was written after ``generation``."""
+        return self._written.get(key, 0) > generation
+
+    def fill(self, key: str, document: dict, generation: int):
+        """Cache a read started at ``generation`` unless it's stale."""
+        if document is not None and not self.stale(key, generation):
+            self.set(key, document)
+
+    def done(self):
+        self.reads -= 1
+        if not self.reads:
+            self._written.clear()
+
+    def set(self, key: str, document: dict):
+        if document is None:
+            return self.invalidate(key)
+        self._write(key)
+        self._entries[key] = (time.monotonic() + self.ttl, document)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._write(key)
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    async def watch(self, collection):
+        """
+        Keep cached documents consistent with writes from other processes.
+
+        Needs a replica set or sharded cluster, change streams are not
+        available on a standalone mongod.
+        """
+        self.watching = True
+        try:
+            async with collection.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    key = change["documentKey"]["_id"]
+                    if key not in self._entries:
+                        continue
+                    if change["operationType"] in ("insert", "update", "replace"):
+                        self.set(key, change.get("fullDocument"))
+                    else:
+                        self.invalidate(key)
+        except Exception as e:
+            print(f"Stopped watching servers for cache updates. Error: {e}")
+            # Entries may be stale from here on, let them refresh from mongodb.
+            self.clear()
+        finally:
+            self.watching = False
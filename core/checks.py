@@ -4,8 +4,9 @@ from discord.ext import commands
 def is_channel_owner():
     async def predicate(ctx):
         if ctx.author.voice:
-            server = await ctx.bot.get_server(ctx.guild.id)
-            channel = server["channels"].get(str(ctx.author.voice.channel.id), None)
+            channel = await ctx.bot.get_temp_channel(
+                ctx.author.voice.channel.id, ("creator",)
+            )
             if channel:
                 creator = channel.get("creator", None)
                 if creator == ctx.author.id:
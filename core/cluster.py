@@ -0,0 +1,271 @@
+"""
+Run shards across several processes.
+
+The launcher starts one worker process per cluster, each owning a range of
+shards, and talks to them over pipes. Workers report their guild count and
+health every few seconds and get the totals of every cluster back, so
+presence and ``about`` show numbers for the whole bot.
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from discord.ext import tasks
+
+
+# Exit code of a stub worker whose totals were wrong
+STUB_FAILED = 2
+
+
+def split_shards(shard_count: int, clusters: int):
+    per_cluster = -(-shard_count // clusters)
+    return [
+        list(range(start, min(start + per_cluster, shard_count)))
+        for start in range(0, shard_count, per_cluster)
+    ]
+
+
+class ClusterClient:
+    """Worker side of the pipe."""
+
+    def __init__(self, cluster_id: int, connection):
+        self.cluster_id = cluster_id
+        self.connection = connection
+        self.totals = {}
+        self.bot = None
+
+    @property
+    def guilds(self):
+        return self.totals.get("guilds")
+
+    def start(self, bot):
+        self.bot = bot
+        if not self.report.is_running():
+            self.report.start()
+
+    def health(self) -> dict:
+        bot = self.bot
+        return {
+            "cluster": self.cluster_id,
+            "pid": os.getpid(),
+            "shards": list(bot.shards),
+            "guilds": len(bot.guilds),
+            "total_guilds": bot.total_guilds,
+            "latency": bot.latency,
+            "ready": bot.is_ready(),
+            "voice_queue": bot.voice_dispatcher.depth,
+            "time": time.time(),
+        }
+
+    @tasks.loop(seconds=10)
+    async def report(self):
+        self.connection.send(self.health())
+        while self.connection.poll():
+            self.totals = self.connection.recv()
+
+
+def run_worker(cluster_id: int, shard_ids: list, shard_count: int, connection):
+    import bot
+
+    bot.main(
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        cluster=ClusterClient(cluster_id, connection),
+    )
+
+
+# Servers each shard of a stub worker has
+STUB_GUILDS = 1000
+
+
+class StubBot:
+    """The parts of Sonus a ``ClusterClient`` reads, with a fixed guild count."""
+
+    def __init__(self, cluster, shard_ids: list, guilds: int):
+        self.cluster = cluster
+        self.shards = dict.fromkeys(shard_ids)
+        self.guilds = [None] * guilds
+        self.latency = random.uniform(0.03, 0.1)
+        self.voice_dispatcher = SimpleNamespace(depth=0)
+        self.user = SimpleNamespace(name="Sonus")
+        # shard id -> presence text
+        self.presences = {}
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def change_presence(self, *, activity, shard_id: int):
+        self.presences[shard_id] = activity.name
+
+
+def run_stub_worker(cluster_id: int, shard_ids: list, shard_count: int, connection):
+    """
+    Stands in for a worker without connecting to Discord. A real
+    ``ClusterClient`` reports ``STUB_GUILDS`` servers per shard, and Sonus'
+    ``total_guilds`` and ``update_status`` run on the totals it gets back. It
+    crashes now and then when ``STUB_CRASH_RATE`` is set, for trying the
+    launcher on one machine. Exits with 2 if its presence is wrong.
+    """
+    from bot import Sonus
+
+    crash_rate = float(os.environ.get("STUB_CRASH_RATE", 0))
+    client = ClusterClient(cluster_id, connection)
+    client.report.change_interval(seconds=1)
+    bot = StubBot(client, shard_ids, STUB_GUILDS * len(shard_ids))
+    # Borrowed so the stub runs the same code as Sonus.
+    StubBot.total_guilds = Sonus.total_guilds
+
+    async def run():
+        client.start(bot)
+        while True:
+            await asyncio.sleep(1)
+            await Sonus.update_status.coro(bot)
+            shown = f" {bot.total_guilds} servers "
+            if not all(shown in presence for presence in bot.presences.values()):
+                print(f"Cluster {cluster_id} shows {bot.presences}, not{shown}.")
+                raise SystemExit(STUB_FAILED)
+            if random.random() < crash_rate:
+                raise SystemExit(1)
+
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+class Launcher:
+    def __init__(
+        self,
+        shard_count: int,
+        clusters: int,
+        target=run_worker,
+        interval: float = 10,
+        stale_after: float = 60,
+        expected_guilds: int = None,
+    ):
+        self.shard_count = shard_count
+        self.shards = split_shards(shard_count, clusters)
+        self.target = target
+        self.interval = interval
+        self.stale_after = stale_after
+        self.context = multiprocessing.get_context("spawn")
+        # cluster id -> (process, connection)
+        self.workers = {}
+        self.health = {}
+        self.restarts = {}
+        self.started = {}
+        # Checked against the totals when set, for stub workers
+        self.expected_guilds = expected_guilds
+        self.complete_broadcasts = 0
+        self.failures = []
+
+    def start_worker(self, cluster_id: int):
+        connection, child = self.context.Pipe()
+        process = self.context.Process(
+            target=self.target,
+            args=(cluster_id, self.shards[cluster_id], self.shard_count, child),
+            name=f"sonus-cluster-{cluster_id}",
+            daemon=True,
+        )
+        process.start()
+        self.workers[cluster_id] = (process, connection)
+        self.started[cluster_id] = time.monotonic()
+        self.health.pop(cluster_id, None)
+        print(
+            f"Started cluster {cluster_id} (pid {process.pid}) "
+            f"with shards {self.shards[cluster_id][0]}-{self.shards[cluster_id][-1]}."
+        )
+
+    def totals(self) -> dict:
+        healthy = [
+            health
+            for health in self.health.values()
+            if time.time() - health["time"] < self.stale_after
+        ]
+        return {
+            "guilds": sum(health["guilds"] for health in healthy),
+            "clusters": len(self.workers),
+            "healthy": len(healthy),
+            "shards": self.shard_count,
+        }
+
+    def check(self, totals: dict):
+        if totals["healthy"] < totals["clusters"]:
+            self.complete_broadcasts = 0
+            return
+        if totals["guilds"] != self.expected_guilds:
+            self.failures.append(
+                f"Counted {totals['guilds']} servers, expected {self.expected_guilds}."
+            )
+        self.complete_broadcasts += 1
+        # Workers have seen a complete broadcast once the one before was.
+        if self.complete_broadcasts < 3:
+            return
+        for cluster_id, health in self.health.items():
+            if health.get("total_guilds") != self.expected_guilds:
+                self.failures.append(
+                    f"Cluster {cluster_id} counted {health.get('total_guilds')} "
+                    f"servers, expected {self.expected_guilds}."
+                )
+
+    def run(self, rounds: int = None) -> bool:
+        """
+        Run until interrupted or for ``rounds`` broadcasts, returns False if
+        the totals were checked and found wrong.
+        """
+        for cluster_id in range(len(self.shards)):
+            self.start_worker(cluster_id)
+        last_broadcast = 0
+        broadcasts = 0
+        try:
+            while rounds is None or broadcasts < rounds:
+                for cluster_id, (process, connection) in list(self.workers.items()):
+                    try:
+                        while connection.poll():
+                            self.health[cluster_id] = connection.recv()
+                    except (EOFError, OSError):
+                        pass
+                    if not process.is_alive():
+                        if process.exitcode == STUB_FAILED:
+                            self.failures.append(
+                                f"Cluster {cluster_id} showed the wrong totals."
+                            )
+                        restarts = self.restarts.get(cluster_id, 0) + 1
+                        if time.monotonic() - self.started[cluster_id] > 300:
+                            # It ran fine for a while, start backing off over.
+                            restarts = 1
+                        self.restarts[cluster_id] = restarts
+                        print(
+                            f"Cluster {cluster_id} exited with code {process.exitcode}, "
+                            f"restarting (restart {restarts})."
+                        )
+                        connection.close()
+                        # Back off a little when a cluster keeps crashing.
+                        time.sleep(min(2 ** restarts, 60) if restarts > 3 else 0)
+                        self.start_worker(cluster_id)
+                if time.monotonic() - last_broadcast >= self.interval:
+                    last_broadcast = time.monotonic()
+                    broadcasts += 1
+                    totals = self.totals()
+                    if self.expected_guilds is not None:
+                        self.check(totals)
+                    for _, connection in self.workers.values():
+                        try:
+                            connection.send(totals)
+                        except (BrokenPipeError, OSError):
+                            pass
+                    print(
+                        f"{totals['healthy']}/{totals['clusters']} clusters healthy, "
+                        f"{totals['guilds']} servers."
+                    )
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process, _ in self.workers.values():
+                process.terminate()
+            for process, _ in self.workers.values():
+                process.join(10)
+        for failure in self.failures:
+            print(failure)
+        return not self.failures
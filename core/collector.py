@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import bson
+from discord.ext import tasks
+
+from core import metrics
+
+
+class GarbageCollector:
+    """
+    Prunes stored records of channels, autochannels and servers that no longer
+    exist.
+
+    Each run reads at most ``batches`` batches of ``batch_size`` documents per
+    collection and remembers where it stopped, so the next run picks up from
+    there and the whole database is covered over several runs. It never calls
+    the Discord API, everything is checked against the gateway cache.
+    """
+
+    def __init__(self, bot, batch_size: int = 200, batches: int = 10, delay: float = 1):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.batches = batches
+        self.delay = delay
+        # "servers" or "channels" -> last id looked at
+        self.cursors = {"servers": None, "channels": None}
+        self.runs = 0
+        self.records = 0
+        self.bytes = 0
+        self.last_run = {}
+
+    async def scan(self, iterate, name: str):
+        for _ in range(self.batches):
+            documents = [
+                document
+                async for document in iterate(
+                    after=self.cursors[name], limit=self.batch_size
+                )
+            ]
+            if not documents:
+                # Start over next run.
+                self.cursors[name] = None
+                return
+            self.cursors[name] = documents[-1]["_id"]
+            yield documents
+            await asyncio.sleep(self.delay)
+
+    def guild_gone(self, guild_id) -> bool:
+        return self.bot.owns_guild(int(guild_id)) and self.bot.get_guild(int(guild_id)) is None
+
+    @tasks.loop(minutes=30)
+    async def collect(self):
+        start = time.perf_counter()
+        records = 0
+        size = 0
+
+        async for channels in self.scan(self.bot.storage.temp_channels, "channels"):
+            stale = []
+            for channel in channels:
+                guild = self.bot.get_guild(int(channel["guild"]))
+                if guild is not None and guild.unavailable:
+                    # Its channels aren't known until it's available again.
+                    continue
+                if self.guild_gone(channel["guild"]) or (
+                    guild is not None and guild.get_channel(int(channel["_id"])) is None
+                ):
+                    stale.append(channel)
+                    size += len(bson.encode(channel))
+            records += await self.bot.storage.delete_temp_channels(
+                [channel["_id"] for channel in stale]
+            )
+            for channel in stale:
+                channel_id = int(channel["_id"])
+                if channel.get("spare"):
+                    self.bot.pool.discard(channel.get("autochannel"), channel_id)
+                elif channel_id in self.bot.index.temp_channels:
+                    # Only channels the bot knew about were counted.
+                    metrics.temp_channels.dec(guild=channel["guild"])
+            self.bot.index.discard_temp_channels(channel["_id"] for channel in stale)
+
+        async for servers in self.scan(self.bot.storage.servers, "servers"):
+            gone = []
+            missing = {}
+            for server in servers:
+                if self.guild_gone(server["_id"]):
+                    gone.append(server["_id"])
+                    size += len(bson.encode(server))
+                    continue
+                guild = self.bot.get_guild(int(server["_id"]))
+                if guild is None or guild.unavailable:
+                    continue
+                autochannels = {
+                    channel_id: config
+                    for channel_id, config in (server.get("autochannels") or {}).items()
+                    if guild.get_channel(int(channel_id)) is None
+                }
+                if autochannels:
+                    missing[server["_id"]] = list(autochannels)
+                    size += len(bson.encode(autochannels))
+            records += await self.bot.storage.prune_autochannels(missing)
+            for channel_ids in missing.values():
+                self.bot.index.autochannels.difference_update(map(int, channel_ids))
+            records += await self.bot.storage.delete_servers(gone)
+            records += await self.bot.storage.delete_server_temp_channels(gone)
+            for server_id in list(missing) + gone:
+                self.bot.cache.invalidate(server_id)
+            for server_id in gone:
+                metrics.temp_channels.remove(guild=server_id)
+
+        self.runs += 1
+        self.records += records
+        self.bytes += size
+        self.last_run = {
+            "records": records,
+            "bytes": size,
+            "seconds": time.perf_counter() - start,
+        }
+        from humanize import naturalsize
+
+        print(
+            f"Garbage collected {records} records ({naturalsize(size)}) "
+            f"in {self.last_run['seconds']:.2f}s."
+        )
+
+    @collect.before_loop
+    async def before_collect(self):
+        await self.bot.wait_until_ready()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "records": self.records,
+            "bytes": self.bytes,
+            **{f"last_{key}": value for key, value in self.last_run.items()},
+        }
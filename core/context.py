@@ -0,0 +1,12 @@
+from discord.ext import commands
+
+from core.scheduler import REPLY, messages_route
+
+
+class SonusContext(commands.Context):
+    async def send(self, *args, **kwargs):
+        # Replies wait behind moves and channel changes when rate limited.
+        send = super().send
+        return await self.bot.rest.run(
+            REPLY, messages_route(self.channel.id), lambda: send(*args, **kwargs)
+        )
@@ -0,0 +1,25 @@
+import re
+
+import discord
+from discord.ext import commands
+
+
+class MemberConverter(commands.MemberConverter):
+    """
+    Member converter that falls back to fetching the member over REST.
+
+    In lean mode only members in voice are cached and the gateway member query
+    can come back empty, so ids and mentions are fetched directly instead.
+    """
+
+    async def convert(self, ctx, argument):
+        try:
+            return await super().convert(ctx, argument)
+        except commands.MemberNotFound:
+            match = self._get_id_match(argument) or re.match(r"<@!?([0-9]+)>$", argument)
+            if match is None or ctx.guild is None:
+                raise
+            try:
+                return await ctx.guild.fetch_member(int(match.group(1)))
+            except discord.HTTPException:
+                raise commands.MemberNotFound(argument)
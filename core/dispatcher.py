@@ -0,0 +1,138 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+
+from core import metrics
+
+
+class VoiceEvent:
+    __slots__ = ("member", "before", "after", "queued_at")
+
+    def __init__(self, member, before, after):
+        self.member = member
+        self.before = before
+        self.after = after
+        self.queued_at = time.perf_counter()
+
+
+class VoiceDispatcher:
+    """
+    Runs voice state events in order per guild and in parallel across guilds.
+
+    Every guild gets its own queue. A guild with pending events is handed to
+    one worker at a time, so events of the same guild never interleave while
+    different guilds are processed by the rest of the pool.
+
+    Events still waiting in a queue are coalesced: when a member leaves a
+    channel before their join into it was processed, the join is dropped and
+    only the leave is kept. Leaves are never dropped so emptied temp channels
+    are always looked at.
+    """
+
+    def __init__(self, handler, workers: int = 16, maxsize: int = 500, on_error=None):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.on_error = on_error
+        self.queues = {}
+        self.ready = asyncio.Queue()
+        self.tasks = []
+        self.space = {}
+        # Metrics
+        self.received = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.queue_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [
+                asyncio.ensure_future(self.worker()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def put(self, guild_id: int, member, before, after):
+        self.received += 1
+        queue = self.queues.get(guild_id)
+        if queue is None:
+            queue = self.queues[guild_id] = deque()
+            self.ready.put_nowait(guild_id)
+        if before is not None:
+            self.coalesce(queue, member, before)
+        while len(queue) >= self.maxsize:
+            self.backpressure_waits += 1
+            start = time.perf_counter()
+            space = self.space.setdefault(guild_id, asyncio.Event())
+            space.clear()
+            await space.wait()
+            self.backpressure_seconds += time.perf_counter() - start
+            queue = self.queues.get(guild_id)
+            if queue is None:
+                queue = self.queues[guild_id] = deque()
+                self.ready.put_nowait(guild_id)
+        queue.append(VoiceEvent(member, before, after))
+        self.max_depth = max(self.max_depth, len(queue))
+
+    def coalesce(self, queue: deque, member, before):
+        for event in reversed(queue):
+            if event.member.id != member.id:
+                continue
+            if event.after is not None and event.after.id == before.id:
+                # Joined and left again before the join was handled.
+                self.coalesced += 1
+                if event.before is None:
+                    queue.remove(event)
+                else:
+                    event.after = None
+            return
+
+    async def worker(self):
+        while True:
+            guild_id = await self.ready.get()
+            queue = self.queues[guild_id]
+            while queue:
+                event = queue.popleft()
+                space = self.space.get(guild_id)
+                if space is not None:
+                    space.set()
+                start = time.perf_counter()
+                self.queue_seconds += start - event.queued_at
+                try:
+                    await self.handler(event.member, event.before, event.after)
+                except Exception as e:
+                    if self.on_error is None:
+                        traceback.print_exc()
+                    else:
+                        self.on_error(e)
+                metrics.voice_handler.observe(time.perf_counter() - start)
+                self.processed += 1
+            # Nothing is left for this guild, forget about it until next time.
+            del self.queues[guild_id]
+            self.space.pop(guild_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.tasks),
+            "guilds": len(self.queues),
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "coalesced": self.coalesced,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": self.backpressure_seconds,
+            "queue_seconds": self.queue_seconds,
+        }
@@ -0,0 +1,90 @@
+import heapq
+from difflib import SequenceMatcher
+
+
+def distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y))
+            )
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of words for close match lookups.
+
+    The triangle inequality lets a lookup skip every subtree whose edge distance
+    is too far from the query, so only a few words are ever compared.
+    """
+
+    def __init__(self, words=()):
+        self.root = None
+        self.size = 0
+        self.longest = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word: str):
+        self.longest = max(self.longest, len(word))
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            d = distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def within(self, word: str, max_distance: int) -> list:
+        """Every (distance, word) pair at most ``max_distance`` from ``word``."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_word, children = stack.pop()
+            d = distance(word, node_word)
+            if d <= max_distance:
+                found.append((d, node_word))
+            for edge, child in children.items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return found
+
+    def close_matches(self, word: str, n: int = 3, cutoff: float = 0.6) -> list:
+        """
+        Same as ``difflib.get_close_matches`` over the words in the tree. A
+        word scoring ``cutoff`` is at most ``(1 - cutoff)`` of both lengths in
+        edits away, so only words that close are scored.
+        """
+        radius = int((1 - cutoff) * (len(word) + self.longest))
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        scored = []
+        for _, candidate in self.within(word, radius):
+            matcher.set_seq1(candidate)
+            if (
+                matcher.real_quick_ratio() >= cutoff
+                and matcher.quick_ratio() >= cutoff
+                and matcher.ratio() >= cutoff
+            ):
+                scored.append((matcher.ratio(), candidate))
+        return [candidate for _, candidate in heapq.nlargest(n, scored)]
@@ -0,0 +1,68 @@
+import time
+
+NOOP = "noop"
+LEAVE = "leave"
+JOIN = "join"
+MOVE = "move"
+
+
+class ChannelIndex:
+    """
+    Ids of every autochannel and temp channel this process handles.
+
+    Loaded once at startup and kept current by the bot's write paths, so voice
+    state and channel delete events can be told apart from the rest of a
+    guild's traffic without reading the database.
+    """
+
+    def __init__(self):
+        self.autochannels = set()
+        # temp channel id -> id of the autochannel it was made by
+        self.temp_channels = {}
+        self.skipped = 0
+
+    async def load(self, storage, owns_guild=lambda guild_id: True, log=print):
+        start = time.perf_counter()
+        async for server in storage.servers():
+            if owns_guild(int(server["_id"])):
+                self.autochannels.update(
+                    map(int, server.get("autochannels") or {})
+                )
+        async for channel in storage.temp_channels():
+            if owns_guild(int(channel["guild"])):
+                self.temp_channels[int(channel["_id"])] = channel.get("autochannel")
+        log(
+            f"Indexed {len(self.autochannels)} autochannels and "
+            f"{len(self.temp_channels)} temp channels in "
+            f"{time.perf_counter() - start:.2f}s."
+        )
+
+    def discard_temp_channels(self, channel_ids):
+        for channel_id in channel_ids:
+            self.temp_channels.pop(int(channel_id), None)
+
+    def classify(self, before, after) -> str:
+        """
+        What a voice state update means for Sonus: leaving a temp channel or
+        autochannel, joining an autochannel, both, or nothing at all. Leaving
+        an autochannel cancels a join that is still queued.
+        """
+        before_id = before.id if before else None
+        after_id = after.id if after else None
+        if before_id == after_id:
+            # Mute, deafen, stream or video toggles.
+            kind = NOOP
+        else:
+            leave = before_id in self.temp_channels or before_id in self.autochannels
+            join = after_id in self.autochannels
+            kind = MOVE if leave and join else LEAVE if leave else JOIN if join else NOOP
+        if kind == NOOP:
+            self.skipped += 1
+        return kind
+
+    def stats(self) -> dict:
+        return {
+            "autochannels": len(self.autochannels),
+            "temp_channels": len(self.temp_channels),
+            "skipped": self.skipped,
+        }
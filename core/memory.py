@@ -0,0 +1,31 @@
+import os
+import sys
+
+
+def resident_memory() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return 0
+    # Peak instead of current outside of linux, in bytes on macOS and KiB elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_stats(bot) -> dict:
+    rss = resident_memory()
+    guilds = len(bot.guilds)
+    return {
+        "mode": "lean" if bot.lean else "full",
+        "rss_mb": rss / 2 ** 20,
+        "per_1k_guilds_mb": rss / 2 ** 20 / guilds * 1000 if guilds else 0.0,
+        "guilds": guilds,
+        "cached_members": sum(len(guild.members) for guild in bot.guilds),
+    }
@@ -0,0 +1,244 @@
+"""
+A small metrics registry with a Prometheus text endpoint.
+
+Metrics are plain counters, gauges and histograms keyed by label values, cheap
+enough to update on every event. Set ``METRICS_PORT`` to serve them at
+``/metrics``.
+"""
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for key, value in list(self.values.items()):
+            yield f"{self.name}{format_labels(self.labels, key)} {value}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        self.values[self.key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        value = self.values.get(key, 0) + amount
+        if value == 0 and self.labels:
+            # Don't keep a label set around for every server that ever had one.
+            self.values.pop(key, None)
+        else:
+            self.values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels):
+        self.values.pop(self.key(labels), None)
+
+    def render(self):
+        if self.function is not None:
+            self.values[()] = self.function()
+        yield from super().render()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            # Counts per bucket, then sum and count.
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for key, (counts, total, count) in list(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labels, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+voice_handler = registry.histogram(
+    "sonus_voice_handler_seconds", "Time spent handling one voice state event."
+)
+voice_phase = registry.histogram(
+    "sonus_voice_phase_seconds",
+    "Time spent in each phase of the voice state handler.",
+    ("phase",),
+)
+commands = registry.histogram(
+    "sonus_command_seconds", "Time spent running commands.", ("command",)
+)
+cooldowns = registry.counter(
+    "sonus_command_cooldowns_total", "Commands rejected by a cooldown.", ("command",)
+)
+mongo = registry.histogram(
+    "sonus_mongo_command_seconds", "Latency of mongodb commands.", ("command",)
+)
+mongo_failures = registry.counter(
+    "sonus_mongo_command_failures_total", "Failed mongodb commands.", ("command",)
+)
+rate_limit_waits = registry.histogram(
+    "sonus_rest_rate_limit_wait_seconds",
+    "Time REST requests waited on Discord rate limits.",
+    ("kind",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+rest_queue_wait = registry.histogram(
+    "sonus_rest_queue_wait_seconds",
+    "Time REST requests waited in the scheduler, per priority class.",
+    ("priority",),
+)
+churn_limited = registry.counter(
+    "sonus_churn_limited_total",
+    "Joins over a channel churn quota, by limit and what was done instead.",
+    ("scope", "action"),
+)
+temp_channels = registry.gauge(
+    "sonus_temp_channels", "Live temp channels per server.", ("guild",)
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records the latency of every mongodb command, register it on the client."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        mongo.observe(event.duration_micros / 1e6, command=event.command_name)
+        mongo_failures.inc(command=event.command_name)
+
+
+class RateLimitMetrics(logging.Handler):
+    """
+    Picks rate limit waits out of the ``discord.http`` log, which is the only
+    place discord.py reports them.
+    """
+
+    def emit(self, record):
+        message = record.msg
+        if not isinstance(message, str) or not record.args:
+            return
+        if message.startswith("We are being rate limited."):
+            rate_limit_waits.observe(float(record.args[0]), kind="429")
+        elif message.startswith("A rate limit bucket has been exhausted"):
+            rate_limit_waits.observe(float(record.args[1]), kind="bucket")
+
+    @classmethod
+    def install(cls):
+        logger = logging.getLogger("discord.http")
+        if not any(isinstance(handler, cls) for handler in logger.handlers):
+            logger.addHandler(cls(logging.DEBUG))
+            if logger.getEffectiveLevel() > logging.DEBUG:
+                logger.setLevel(logging.DEBUG)
+
+
+async def serve(host: str, port: int):
+    async def handle(request):
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,105 @@
+"""
+Versioned schema migrations for the ``servers`` collection.
+
+Runs when the bot starts if any document is older than ``SCHEMA_VERSION``, or
+by hand with ``python -m core.migrations``. Documents are streamed with a cursor and written back
+in batches, and each upgraded document is stamped with ``SCHEMA_VERSION`` so
+it is never looked at again.
+"""
+import asyncio
+import os
+import time
+
+from pymongo import ReplaceOne, UpdateOne
+
+
+def v1_dicts(server: dict, channel_requests: list):
+    # Channels and autochannels used to be lists of ids.
+    if type(server.get("channels")) is list:
+        server["channels"] = dict.fromkeys(map(str, server["channels"]))
+    if type(server.get("autochannels")) is list:
+        server["autochannels"] = dict.fromkeys(map(str, server["autochannels"]))
+    server.setdefault("autochannels", dict())
+
+
+def v2_channels_collection(server: dict, channel_requests: list):
+    # Temp channels moved to their own collection.
+    for channel_id, record in (server.pop("channels", None) or {}).items():
+        record = record or {}
+        channel_requests.append(
+            ReplaceOne(
+                {"_id": str(channel_id)},
+                {
+                    "_id": str(channel_id),
+                    "guild": server["_id"],
+                    "creator": record.get("creator"),
+                    "autochannel": record.get("autochannel"),
+                },
+                upsert=True,
+            )
+        )
+
+
+MIGRATIONS = [(1, v1_dicts), (2, v2_channels_collection)]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+# Documents that haven't been migrated, including ones without a version
+OUTDATED = {"schema": {"$not": {"$gte": SCHEMA_VERSION}}}
+
+
+def upgrade(server: dict, channel_requests: list):
+    version = server.get("schema", 0)
+    original = dict(server)
+    for target, migration in MIGRATIONS:
+        if version < target:
+            migration(server, channel_requests)
+    server["schema"] = SCHEMA_VERSION
+    update = {"$set": {k: v for k, v in server.items() if k != "_id"}}
+    removed = original.keys() - server.keys()
+    if removed:
+        update["$unset"] = dict.fromkeys(removed, "")
+    # Only apply if nobody migrated the document in the meantime.
+    return UpdateOne({"_id": server["_id"], "schema": original.get("schema")}, update)
+
+
+async def migrate(db, batch_size: int = 500, log=print) -> int:
+    start = time.perf_counter()
+    migrated = 0
+    server_requests = []
+    channel_requests = []
+
+    async def flush():
+        # Channels first so a crash never leaves a server without its channels.
+        if channel_requests:
+            await db.channels.bulk_write(channel_requests, ordered=False)
+            channel_requests.clear()
+        if server_requests:
+            await db.servers.bulk_write(server_requests, ordered=False)
+            server_requests.clear()
+
+    cursor = db.servers.find(OUTDATED, batch_size=batch_size)
+    async for server in cursor:
+        server_requests.append(upgrade(server, channel_requests))
+        migrated += 1
+        if len(server_requests) >= batch_size:
+            await flush()
+            log(f"Migrated {migrated} servers...")
+    await flush()
+    log(
+        f"Migrated {migrated} servers to schema v{SCHEMA_VERSION} "
+        f"in {time.perf_counter() - start:.2f}s."
+    )
+    return migrated
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    mongo_uri = os.environ.get("MONGO_URI", None)
+    if mongo_uri is None or len(mongo_uri.strip()) == 0:
+        print("\nA mongodb uri is necessary to migrate.\n")
+        raise RuntimeError
+    asyncio.get_event_loop().run_until_complete(
+        migrate(AsyncIOMotorClient(mongo_uri).sonus)
+    )
@@ -0,0 +1,128 @@
+import asyncio
+from collections import OrderedDict
+
+import discord
+from discord_components import Button, ButtonStyle
+
+PREVIOUS = "paginator:previous"
+NEXT = "paginator:next"
+
+
+class Session:
+    __slots__ = ("message", "author_id", "pages", "page", "expiry")
+
+    def __init__(self, message: discord.Message, author_id: int, pages: list):
+        self.message = message
+        self.author_id = author_id
+        self.pages = pages
+        self.page = 0
+        self.expiry = None
+
+    def components(self) -> list:
+        return [
+            [
+                Button(
+                    style=ButtonStyle.gray,
+                    label="◀",
+                    custom_id=PREVIOUS,
+                    disabled=self.page == 0,
+                ),
+                Button(
+                    style=ButtonStyle.gray,
+                    label="▶",
+                    custom_id=NEXT,
+                    disabled=self.page == len(self.pages) - 1,
+                ),
+            ]
+        ]
+
+
+class Paginator:
+    """
+    Button pages for embeds.
+
+    One ``button_click`` listener serves every paginated message instead of a
+    ``wait_for`` per message. Sessions end after ``timeout`` seconds without a
+    click and at most ``max_sessions`` are kept, the oldest are ended first.
+    """
+
+    def __init__(self, bot, max_sessions: int = 200, timeout: float = 60):
+        self.bot = bot
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        # message id -> session
+        self.sessions = OrderedDict()
+        self.started = 0
+        self.expired = 0
+        self.evicted = 0
+        bot.add_listener(self.on_button_click, "on_button_click")
+
+    async def send(self, ctx, pages: list):
+        """Send ``pages``, a list of embeds, with buttons for the author to turn them."""
+        if len(pages) == 1:
+            return await ctx.send(embed=pages[0])
+        session = Session(None, ctx.author.id, pages)
+        session.message = await ctx.send(
+            embed=pages[0], components=session.components()
+        )
+        self.sessions[session.message.id] = session
+        self.started += 1
+        self.touch(session)
+        while len(self.sessions) > self.max_sessions:
+            _, oldest = self.sessions.popitem(last=False)
+            self.evicted += 1
+            self.end(oldest)
+        return session.message
+
+    def touch(self, session: Session):
+        if session.expiry is not None:
+            session.expiry.cancel()
+        session.expiry = asyncio.get_event_loop().call_later(
+            self.timeout, self.expire, session.message.id
+        )
+
+    def expire(self, message_id: int):
+        session = self.sessions.pop(message_id, None)
+        if session is not None:
+            self.expired += 1
+            self.end(session)
+
+    def end(self, session: Session):
+        if session.expiry is not None:
+            session.expiry.cancel()
+        asyncio.ensure_future(self.remove_buttons(session.message))
+
+    @staticmethod
+    async def remove_buttons(message: discord.Message):
+        try:
+            await message.edit(components=[])
+        except discord.HTTPException:
+            pass
+
+    async def on_button_click(self, interaction):
+        if interaction.custom_id not in (PREVIOUS, NEXT):
+            return
+        session = self.sessions.get(interaction.message.id)
+        if session is None:
+            return
+        if interaction.user.id != session.author_id:
+            return await interaction.respond(
+                content="Only the person who used the command can turn pages."
+            )
+        if interaction.custom_id == PREVIOUS:
+            session.page = max(session.page - 1, 0)
+        else:
+            session.page = min(session.page + 1, len(session.pages) - 1)
+        self.sessions.move_to_end(interaction.message.id)
+        self.touch(session)
+        await interaction.edit_origin(
+            embed=session.pages[session.page], components=session.components()
+        )
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.sessions),
+            "started": self.started,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
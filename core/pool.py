@@ -0,0 +1,154 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+import discord
+from discord.ext import tasks
+
+from core.scheduler import BACKGROUND, channel_route, guild_channels_route
+
+
+class ChannelPool:
+    """
+    Hidden spare channels kept next to autochannels that have pooling on.
+
+    Taking a spare only needs one edit to rename and reveal it before the
+    member is moved, instead of creating a channel while they wait. The number
+    of spares follows how many joins the autochannel had recently and spares
+    nobody needed for a while are deleted again.
+    """
+
+    def __init__(self, bot, max_size: int = 5, window: float = 300, idle: float = 600):
+        self.bot = bot
+        self.max_size = max_size
+        self.window = window
+        self.idle = idle
+        # autochannel id -> deque of (channel id, time it was created)
+        self.spares = {}
+        # autochannel id -> deque of recent join times
+        self.joins = {}
+        self.refilling = set()
+        self.taken = 0
+        self.created = 0
+        self.reclaimed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def target(self, autochannel_id: int) -> int:
+        joins = self.joins.get(autochannel_id)
+        if not joins:
+            return 0
+        cutoff = time.monotonic() - self.window
+        while joins and joins[0] < cutoff:
+            joins.popleft()
+        # Roughly the number of joins expected in the next minute.
+        return min(self.max_size, math.ceil(len(joins) * 60 / self.window))
+
+    async def load(self):
+        async for record in self.bot.storage.temp_channels(spare=True):
+            channel = self.bot.get_channel(int(record["_id"]))
+            if channel is None:
+                await self.bot.delete_channel(
+                    record["_id"], record["guild"], spare=True
+                )
+                continue
+            self.spares.setdefault(record["autochannel"], deque()).append(
+                (channel.id, time.monotonic())
+            )
+
+    def take(self, autochannel: discord.VoiceChannel):
+        spares = self.spares.get(autochannel.id)
+        while spares:
+            channel_id, _ = spares.popleft()
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                self.taken += 1
+                return channel
+        return None
+
+    def discard(self, autochannel_id: int, channel_id: int) -> bool:
+        """Forget a spare that was deleted, returns whether it was one."""
+        spares = self.spares.get(autochannel_id) or ()
+        for spare in spares:
+            if spare[0] == channel_id:
+                spares.remove(spare)
+                return True
+        return False
+
+    def joined(self, autochannel: discord.VoiceChannel, position: int):
+        self.joins.setdefault(autochannel.id, deque()).append(time.monotonic())
+        if autochannel.id not in self.refilling:
+            self.refilling.add(autochannel.id)
+            asyncio.ensure_future(self.refill(autochannel, position))
+
+    async def refill(self, autochannel: discord.VoiceChannel, position: int):
+        try:
+            spares = self.spares.setdefault(autochannel.id, deque())
+            guild = autochannel.guild
+            hidden = {
+                guild.default_role: discord.PermissionOverwrite(
+                    view_channel=False, connect=False
+                ),
+                guild.me: discord.PermissionOverwrite(
+                    view_channel=True, connect=True, manage_channels=True
+                ),
+            }
+            while len(spares) < self.target(autochannel.id):
+                channel = await self.bot.rest.run(
+                    BACKGROUND,
+                    guild_channels_route(guild.id),
+                    lambda: guild.create_voice_channel(
+                        "spare",
+                        category=autochannel.category,
+                        position=position,
+                        bitrate=autochannel.bitrate,
+                        user_limit=autochannel.user_limit,
+                        overwrites=hidden,
+                        reason="Spare channel for faster joins.",
+                    ),
+                )
+                await self.bot.add_temp_channel(
+                    guild.id, channel.id, None, autochannel.id, spare=True
+                )
+                spares.append((channel.id, time.monotonic()))
+                self.created += 1
+        except discord.HTTPException as e:
+            print(f"Failed to create spare channel for {autochannel.id}. Error: {e}")
+        finally:
+            self.refilling.discard(autochannel.id)
+
+    @tasks.loop(minutes=1)
+    async def reclaim(self):
+        now = time.monotonic()
+        for autochannel_id, spares in list(self.spares.items()):
+            target = self.target(autochannel_id)
+            while len(spares) > target and spares[0][1] < now - self.idle:
+                channel_id, _ = spares.popleft()
+                channel = self.bot.get_channel(channel_id)
+                await self.bot.delete_channel(
+                    channel_id, channel.guild.id if channel else None, spare=True
+                )
+                if channel is not None:
+                    try:
+                        await self.bot.rest.run(
+                            BACKGROUND,
+                            channel_route(channel_id),
+                            lambda: channel.delete(reason="Spare channel was not needed."),
+                        )
+                    except discord.NotFound:
+                        pass
+                self.reclaimed += 1
+            if not spares:
+                del self.spares[autochannel_id]
+
+    def stats(self) -> dict:
+        return {
+            "autochannels": len(self.spares),
+            "spares": sum(len(spares) for spares in self.spares.values()),
+            "taken": self.taken,
+            "created": self.created,
+            "reclaimed": self.reclaimed,
+        }
@@ -0,0 +1,136 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a background thread and counts the
+    collapsed stacks, the format flamegraph.pl and speedscope read.
+
+    Nothing is hooked into the profiled thread, so the cost while running is one
+    frame walk per ``interval`` and there is none once stopped.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="stack-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def top(self, limit: int = 10) -> list:
+        """Leaf functions with the most samples, as (function, share) pairs."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            (function, count / self.samples)
+            for function, count in leaves.most_common(limit)
+        ]
+
+
+class FunctionProfiler:
+    """cProfile of everything the event loop thread runs while enabled."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def report(self, sort: str = "cumulative", limit: int = 200) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes up a sleeping task."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - start - self.interval, 0))
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0}
+        return {
+            "samples": len(lags),
+            "mean_ms": sum(lags) / len(lags) * 1000,
+            "p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+            "max_ms": lags[-1] * 1000,
+        }
+
+
+def task_counts() -> Counter:
+    """Running asyncio tasks grouped by the coroutine they run."""
+    counts = Counter()
+    for task in asyncio.all_tasks():
+        coro = getattr(task, "get_coro", lambda: task._coro)()
+        counts[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+    return counts
+
+
+async def measure_lag(seconds: float, interval: float = 0.05) -> dict:
+    monitor = LagMonitor(interval)
+    monitor.start()
+    await asyncio.sleep(seconds)
+    monitor.stop()
+    return monitor.stats()
@@ -0,0 +1,103 @@
+import time
+
+MEMBER = "member"
+GUILD = "guild"
+
+
+class ChurnQuota:
+    """
+    Token buckets on how many temp channels members and servers make.
+
+    Every member of a server and every server gets ``per_minute`` channels a
+    minute and can save up a minute's worth, 0 turns a limit off. Servers can
+    set their own limits in a ``quota`` setting. Buckets that filled up again
+    are dropped once there are more than ``maxsize``, a full bucket is the same
+    as a new one.
+
+    With a member limit, the last channel each member made is remembered in
+    their bucket so they can be sent back to it when they're over a limit.
+    """
+
+    def __init__(
+        self,
+        member_per_minute: int = 5,
+        guild_per_minute: int = 0,
+        maxsize: int = 100000,
+    ):
+        self.member_per_minute = member_per_minute
+        self.guild_per_minute = guild_per_minute
+        self.maxsize = maxsize
+        self.next_prune = maxsize
+        # key -> [tokens, last refill, last channel made]
+        self.buckets = {}
+        # (guild id, member id) waiting for a token
+        self.waiting = set()
+        self.allowed = 0
+        self.limited = {MEMBER: 0, GUILD: 0}
+
+    def limits(self, server: dict) -> dict:
+        quota = server.get("quota") or {}
+        return {
+            MEMBER: quota.get(MEMBER, self.member_per_minute),
+            GUILD: quota.get(GUILD, self.guild_per_minute),
+        }
+
+    def bucket(self, key, per_minute: int, now: float) -> list:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [per_minute, now, None]
+            if len(self.buckets) > self.next_prune:
+                self.prune(now)
+        else:
+            bucket[0] = min(per_minute, bucket[0] + (now - bucket[1]) * per_minute / 60)
+            bucket[1] = now
+        return bucket
+
+    def take(self, guild_id: int, member_id: int, server: dict):
+        """
+        Take a channel from the member's and the server's bucket. Returns None
+        if there was one, otherwise the limit that was hit and the seconds
+        until it allows another channel.
+        """
+        now = time.monotonic()
+        buckets = []
+        for scope, per_minute in self.limits(server).items():
+            if not per_minute:
+                continue
+            key = (guild_id, member_id) if scope == MEMBER else guild_id
+            bucket = self.bucket(key, per_minute, now)
+            if bucket[0] < 1:
+                self.limited[scope] += 1
+                return scope, (1 - bucket[0]) * 60 / per_minute
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket[0] -= 1
+        self.allowed += 1
+        return None
+
+    def created(self, guild_id: int, member_id: int, channel_id: int):
+        bucket = self.buckets.get((guild_id, member_id))
+        if bucket is not None:
+            bucket[2] = channel_id
+
+    def last_channel(self, guild_id: int, member_id: int):
+        bucket = self.buckets.get((guild_id, member_id))
+        return bucket[2] if bucket is not None else None
+
+    def prune(self, now: float):
+        for key, bucket in list(self.buckets.items()):
+            # Buckets refill in at most a minute.
+            if now - bucket[1] >= 60:
+                del self.buckets[key]
+        self.next_prune = max(self.maxsize, len(self.buckets) * 2)
+
+    def stats(self) -> dict:
+        return {
+            "member_per_minute": self.member_per_minute,
+            "server_per_minute": self.guild_per_minute,
+            "buckets": len(self.buckets),
+            "waiting": len(self.waiting),
+            "allowed": self.allowed,
+            "member_limited": self.limited[MEMBER],
+            "server_limited": self.limited[GUILD],
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import Counter
+
+import discord
+
+from core import metrics
+from core.scheduler import BACKGROUND, channel_route
+
+
+async def reconcile(bot, guild_ids: set = None, concurrency: int = 5, log=print):
+    """
+    Clean up temp channels that emptied and autochannels that were deleted
+    while the bot was offline, and re-arm grace periods that hadn't run out.
+
+    Runs in the background after ``on_ready``, channel deletes are limited to
+    ``concurrency`` at a time and the database cleanup is written at the end.
+    Servers that are unavailable have no channels to check against, they're
+    added to ``bot.unreconciled`` and reconciled once they're available again
+    by passing their ``guild_ids``.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    stale_channels = []
+    deletions = []
+    rejoined = []
+    rearmed = 0
+    checked = 0
+    # Live temp channels per reconciled server, spares aren't counted.
+    counts = Counter()
+    reconciled = set()
+
+    def available(guild_id: int):
+        if guild_ids is not None and guild_id not in guild_ids:
+            return None
+        guild = bot.get_guild(guild_id)
+        if guild is not None and guild.unavailable:
+            bot.unreconciled.add(guild_id)
+            return None
+        return guild
+
+    async def delete(channel):
+        async with semaphore:
+            # Somebody may have joined since the channel was looked at.
+            if len(channel.members) != 0:
+                counts[str(channel.guild.id)] += 1
+                return
+            try:
+                await bot.rest.run(
+                    BACKGROUND,
+                    channel_route(channel.id),
+                    lambda: channel.delete(reason="Emptied while Sonus was offline."),
+                )
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                log(f"Failed to delete channel {channel.id}. Error: {e}")
+                return
+            stale_channels.append(str(channel.id))
+
+    # Subsets are reconciled when servers become available again.
+    scope = "" if guild_ids is None else f" of {len(guild_ids)} servers"
+    log(f"Reconciling temp channels{scope}...")
+    async for record in bot.storage.temp_channels():
+        guild = available(int(record["guild"]))
+        if guild is None:
+            continue
+        checked += 1
+        reconciled.add(record["guild"])
+        channel = guild.get_channel(int(record["_id"]))
+        if channel is not None:
+            # Channels made after the snapshot the index was restored from
+            bot.index.temp_channels.setdefault(channel.id, record.get("autochannel"))
+        if channel is None:
+            stale_channels.append(record["_id"])
+        elif channel.id in bot.deletions:
+            # Emptied since the bot started, its grace period is running.
+            counts[record["guild"]] += 1
+        elif not record.get("spare") and len(channel.members) == 0:
+            delay = record["delete_at"] - time.time() if record.get("delete_at") else 0
+            if delay > 0:
+                bot.deletions.schedule(channel.id, delay, bot.on_deletion_due)
+                rearmed += 1
+                counts[record["guild"]] += 1
+            else:
+                deletions.append(asyncio.ensure_future(delete(channel)))
+        else:
+            if record.get("delete_at"):
+                rejoined.append(record["_id"])
+            if not record.get("spare"):
+                counts[record["guild"]] += 1
+        if checked % 1000 == 0:
+            log(f"Checked {checked} temp channels...")
+    await asyncio.gather(*deletions)
+    for guild_id in reconciled:
+        if counts[guild_id]:
+            metrics.temp_channels.set(counts[guild_id], guild=guild_id)
+        else:
+            metrics.temp_channels.remove(guild=guild_id)
+
+    missing = {}
+    async for server in bot.storage.servers():
+        guild = available(int(server["_id"]))
+        if guild is None:
+            continue
+        channel_ids = [
+            channel_id
+            for channel_id in server.get("autochannels") or {}
+            if guild.get_channel(int(channel_id)) is None
+        ]
+        if channel_ids:
+            missing[server["_id"]] = channel_ids
+
+    await bot.storage.delete_temp_channels(stale_channels)
+    for channel_id in rejoined:
+        await bot.storage.set_temp_channel_expiry(channel_id)
+    await bot.storage.prune_autochannels(missing)
+    bot.index.discard_temp_channels(stale_channels)
+    for channel_ids in missing.values():
+        bot.index.autochannels.difference_update(map(int, channel_ids))
+    for server_id in missing:
+        bot.cache.invalidate(server_id)
+    log(
+        f"Reconciled {checked} temp channels{scope} in "
+        f"{time.perf_counter() - start:.2f}s. "
+        f"Removed {len(stale_channels)} temp channels and autochannels from "
+        f"{len(missing)} servers. Re-armed {rearmed} grace periods. "
+        f"{len(bot.unreconciled)} servers are waiting to be available."
+    )
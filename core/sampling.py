@@ -0,0 +1,26 @@
+import time
+
+
+class AdaptiveSampler:
+    """
+    Sentry ``traces_sampler`` that keeps at most ``per_minute`` traces a minute
+    no matter how busy the bot is, instead of tracing a fixed share of events.
+    """
+
+    def __init__(self, per_minute: float = 60):
+        self.rate = per_minute / 60
+        self.capacity = max(per_minute / 6, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def __call__(self, sampling_context: dict) -> float:
+        parent_sampled = sampling_context.get("parent_sampled")
+        if parent_sampled is not None:
+            return float(parent_sampled)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 1.0
+        return 0.0
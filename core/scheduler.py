@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from discord.http import Route
+
+from core import metrics
+
+# Priority classes, lower goes first.
+MOVE = 0
+CHANNEL = 1
+EDIT = 2
+REPLY = 3
+BACKGROUND = 4
+NAMES = ("move", "channel", "edit", "reply", "background")
+
+
+def member_route(guild_id: int) -> str:
+    return Route(
+        "PATCH", "/guilds/{guild_id}/members/{user_id}", guild_id=guild_id, user_id=0
+    ).bucket
+
+
+def guild_channels_route(guild_id: int) -> str:
+    return Route("POST", "/guilds/{guild_id}/channels", guild_id=guild_id).bucket
+
+
+def channel_route(channel_id: int) -> str:
+    return Route("PATCH", "/channels/{channel_id}", channel_id=channel_id).bucket
+
+
+def messages_route(channel_id: int) -> str:
+    return Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id).bucket
+
+
+class Request:
+    __slots__ = (
+        "priority",
+        "route",
+        "key",
+        "factory",
+        "future",
+        "calls",
+        "queued_at",
+        "started",
+        "limited",
+    )
+
+    def __init__(self, priority: int, route: str, key, factory, future, calls=None):
+        self.priority = priority
+        self.route = route
+        self.key = key
+        self.factory = factory
+        self.future = future
+        self.calls = calls
+        self.queued_at = time.perf_counter()
+        self.started = False
+        # Sleeping on a rate limit, no longer counted as running
+        self.limited = False
+
+
+class RestScheduler:
+    """
+    Runs REST calls by priority class, so a member's move into their channel
+    doesn't wait behind chat replies when the bot or a guild is rate limited.
+
+    Routes are discord.py rate limit buckets. One request per route runs at a
+    time and at most ``concurrency`` run at once, the rest wait in priority
+    order. Routes are skipped while discord.py reports their bucket exhausted,
+    and a request that got rate limited stops counting as running while
+    discord.py sleeps before retrying it, so it can't hold up other guilds.
+    A request with a ``key`` replaces a queued request with the same key, which
+    then returns None, like a rename superseded by a newer one. Requests
+    that are started are counted by priority in ``calls`` if given.
+    """
+
+    def __init__(self, concurrency: int = 10):
+        self.concurrency = concurrency
+        self.queue = []
+        self.counter = itertools.count()
+        self.running = 0
+        # route -> request running on it
+        self.busy_routes = {}
+        # route -> time it can be used again
+        self.blocked = {}
+        # key -> queued request
+        self.keys = {}
+        self.timer = None
+        self.completed = 0
+        self.superseded = 0
+        self.blocks = 0
+
+    async def run(self, priority: int, route: str, factory, key=None, calls=None):
+        """Schedule ``factory()``, a function returning a coroutine, and return its result."""
+        request = Request(
+            priority,
+            route,
+            key,
+            factory,
+            asyncio.get_event_loop().create_future(),
+            calls,
+        )
+        if key is not None:
+            queued = self.keys.get(key)
+            if queued is not None and not queued.started:
+                queued.started = True
+                if not queued.future.done():
+                    queued.future.set_result(None)
+                self.superseded += 1
+            self.keys[key] = request
+        heapq.heappush(self.queue, (priority, next(self.counter), request))
+        self.pump()
+        return await request.future
+
+    def block(self, route: str, seconds: float):
+        self.blocks += 1
+        self.blocked[route] = max(
+            self.blocked.get(route, 0), time.perf_counter() + seconds
+        )
+        request = self.busy_routes.get(route)
+        if request is not None and not request.limited:
+            request.limited = True
+            self.running -= 1
+            self.pump()
+
+    def pump(self):
+        now = time.perf_counter()
+        waiting = []
+        wake = None
+        while self.queue and self.running < self.concurrency:
+            item = heapq.heappop(self.queue)
+            request = item[2]
+            if request.started:
+                # Superseded
+                continue
+            until = self.blocked.get(request.route)
+            if until is not None and until <= now:
+                del self.blocked[request.route]
+                until = None
+            if until is not None:
+                wake = until if wake is None else min(wake, until)
+                waiting.append(item)
+            elif request.route in self.busy_routes:
+                waiting.append(item)
+            else:
+                self.start(request, now)
+        for item in waiting:
+            heapq.heappush(self.queue, item)
+        if wake is not None:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = asyncio.get_event_loop().call_later(wake - now, self.pump)
+
+    def start(self, request: Request, now: float):
+        request.started = True
+        if request.calls is not None:
+            request.calls[NAMES[request.priority]] += 1
+        self.running += 1
+        self.busy_routes[request.route] = request
+        metrics.rest_queue_wait.observe(
+            now - request.queued_at, priority=NAMES[request.priority]
+        )
+        asyncio.ensure_future(self.execute(request))
+
+    async def execute(self, request: Request):
+        try:
+            result = await request.factory()
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            if not request.limited:
+                self.running -= 1
+            self.completed += 1
+            del self.busy_routes[request.route]
+            if request.key is not None and self.keys.get(request.key) is request:
+                del self.keys[request.key]
+            self.pump()
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.queue),
+            "running": self.running,
+            "rate_limited": len(self.busy_routes) - self.running,
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "blocked_routes": len(self.blocked),
+            "blocks": self.blocks,
+        }
+
+
+class RateLimitTracker(logging.Handler):
+    """Tells the scheduler which buckets discord.py found exhausted."""
+
+    def __init__(self, scheduler: RestScheduler):
+        super().__init__(logging.DEBUG)
+        self.scheduler = scheduler
+
+    def emit(self, record):
+        message = record.msg
+        if not isinstance(message, str) or not record.args:
+            return
+        if message.startswith("We are being rate limited."):
+            self.scheduler.block(record.args[1], float(record.args[0]))
+        elif message.startswith("A rate limit bucket has been exhausted"):
+            self.scheduler.block(record.args[0], float(record.args[1]))
+
+    def install(self):
+        # 429s are logged as warnings, exhausted buckets only show up once
+        # something like RateLimitMetrics lowers the level to debug.
+        logging.getLogger("discord.http").addHandler(self)
@@ -0,0 +1,12 @@
+def parse_shard_ids(value: str):
+    """
+    Parse shard ids like ``0,1,2``, ``0-3`` or ``0-3,8-11``.
+    Returns None when the value is empty so every shard is used.
+    """
+    if value is None or len(value.strip()) == 0:
+        return None
+    shard_ids = []
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from discord.ext import tasks
+
+MAGIC = b"SNUS"
+VERSION = 1
+# magic, version, crc32 of the body, unix time written, shard key,
+# autochannel count, temp channel count, server count
+HEADER = struct.Struct("<4sHIdIIII")
+AUTOCHANNEL = struct.Struct("<Q")
+# channel id, autochannel id or 0
+TEMP_CHANNEL = struct.Struct("<QQ")
+# server id, length of the JSON document that follows
+SERVER = struct.Struct("<QI")
+# Stamps written by other hosts may be this many seconds behind our clock.
+CLOCK_SKEW = 60
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def shard_key(shard_count, shard_ids) -> int:
+    """Identifies the configured shards, a snapshot only fits the same ones."""
+    shards = sorted(shard_ids) if shard_ids is not None else None
+    return zlib.crc32(repr((shard_count, shards)).encode())
+
+
+def encode(
+    written_at: float, shards: int, autochannels, temp_channels: dict, servers: list
+) -> bytes:
+    body = bytearray()
+    for channel_id in autochannels:
+        body += AUTOCHANNEL.pack(channel_id)
+    for channel_id, autochannel in temp_channels.items():
+        body += TEMP_CHANNEL.pack(channel_id, autochannel or 0)
+    for server in servers:
+        document = json.dumps(server, separators=(",", ":"), default=str).encode()
+        body += SERVER.pack(int(server["_id"]), len(document))
+        body += document
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        zlib.crc32(body),
+        written_at,
+        shards,
+        len(autochannels),
+        len(temp_channels),
+        len(servers),
+    )
+    return header + body
+
+
+def decode(buffer) -> dict:
+    """Read a snapshot from ``buffer``, fixed width records are read in place."""
+    if len(buffer) < HEADER.size:
+        raise SnapshotError("truncated header")
+    (
+        magic,
+        version,
+        checksum,
+        written_at,
+        shards,
+        autochannel_count,
+        temp_channel_count,
+        server_count,
+    ) = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"version {version}, this version reads {VERSION}")
+    with memoryview(buffer) as view:
+        body = view[HEADER.size :]
+        try:
+            if zlib.crc32(body) != checksum:
+                raise SnapshotError("checksum mismatch")
+            offset = autochannel_count * AUTOCHANNEL.size
+            temp_channels_end = offset + temp_channel_count * TEMP_CHANNEL.size
+            if temp_channels_end > len(body):
+                raise SnapshotError("truncated body")
+            autochannels = [
+                channel_id for (channel_id,) in AUTOCHANNEL.iter_unpack(body[:offset])
+            ]
+            temp_channels = {
+                channel_id: autochannel or None
+                for channel_id, autochannel in TEMP_CHANNEL.iter_unpack(
+                    body[offset:temp_channels_end]
+                )
+            }
+            offset = temp_channels_end
+            servers = []
+            for _ in range(server_count):
+                _, length = SERVER.unpack_from(body, offset)
+                offset += SERVER.size
+                servers.append(json.loads(bytes(body[offset : offset + length])))
+                offset += length
+        except struct.error:
+            raise SnapshotError("truncated body")
+        finally:
+            body.release()
+    return {
+        "written_at": written_at,
+        "shards": shards,
+        "autochannels": autochannels,
+        "temp_channels": temp_channels,
+        "servers": servers,
+    }
+
+
+class Snapshot:
+    """
+    Binary snapshot of the channel index and server cache for warm restarts.
+
+    Written on shutdown and every ``interval`` minutes if set. On startup it's
+    loaded before the gateway connects, so the first voice events after a
+    restart are served from memory. Servers written after the snapshot, by
+    this process before it died or by other processes, are then read in the
+    background by their ``updated_at`` stamps. Temp channels the snapshot
+    missed are picked up by reconcile.
+
+    The file is a fixed header, fixed width autochannel and temp channel
+    records and JSON server documents, checked with a crc32. A snapshot of
+    another version, of other shards or that fails the check is ignored.
+    """
+
+    def __init__(self, bot, path: str, shards: int, interval: float = 0):
+        self.bot = bot
+        self.path = path
+        self.shards = shards
+        self.interval = interval
+        if interval:
+            self.autosave.change_interval(minutes=interval)
+        self.restored = None
+        self.refreshed = 0
+        self.saves = 0
+        self.last_save = None
+
+    def read(self) -> dict:
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return decode(buffer)
+
+    def write(self, data: bytes):
+        # Replaced in one step so a crash mid write leaves the old snapshot.
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+    async def restore(self, log=print) -> bool:
+        """Fill the channel index and server cache, returns whether it could."""
+        start = time.perf_counter()
+        loop = asyncio.get_event_loop()
+        try:
+            state = await loop.run_in_executor(None, self.read)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, SnapshotError) as e:
+            log(f"Ignoring snapshot {self.path}. Error: {e}")
+            return False
+        if state["shards"] != self.shards:
+            log(f"Ignoring snapshot {self.path}, it was written for other shards.")
+            return False
+        index = self.bot.index
+        index.autochannels.update(state["autochannels"])
+        index.temp_channels.update(state["temp_channels"])
+        for server in state["servers"]:
+            self.bot.cache.set(server["_id"], server)
+        took = time.perf_counter() - start
+        age = time.time() - state["written_at"]
+        self.restored = {
+            "age_s": age,
+            "load_ms": took * 1000,
+            "autochannels": len(state["autochannels"]),
+            "temp_channels": len(state["temp_channels"]),
+            "servers": len(state["servers"]),
+        }
+        log(
+            f"Restored {len(state['autochannels'])} autochannels, "
+            f"{len(state['temp_channels'])} temp channels and "
+            f"{len(state['servers'])} servers from a {age:.0f}s old snapshot "
+            f"in {took:.2f}s."
+        )
+        asyncio.ensure_future(self.refresh(state["written_at"], log))
+        return True
+
+    async def refresh(self, since: float, log=print):
+        start = time.perf_counter()
+        generation = self.bot.cache.reading()
+        try:
+            async for server in self.bot.storage.updated_servers(since - CLOCK_SKEW):
+                if not self.bot.owns_guild(int(server["_id"])):
+                    continue
+                if self.bot.cache.stale(server["_id"], generation):
+                    # Written by this process since, that's newer.
+                    continue
+                cached = self.bot.cache.peek(server["_id"])
+                autochannels = set(map(int, server.get("autochannels") or {}))
+                if cached is not None:
+                    self.bot.index.autochannels.difference_update(
+                        set(map(int, cached.get("autochannels") or {})) - autochannels
+                    )
+                self.bot.index.autochannels.update(autochannels)
+                self.bot.cache.fill(server["_id"], server, generation)
+                self.refreshed += 1
+        except Exception as e:
+            # Cached servers expire after CACHE_TTL and are read again anyway.
+            log(f"Failed to refresh servers from the snapshot. Error: {e}")
+            return
+        finally:
+            self.bot.cache.done()
+        log(
+            f"Refreshed {self.refreshed} servers written since the snapshot in "
+            f"{time.perf_counter() - start:.2f}s."
+        )
+
+    async def save(self):
+        start = time.perf_counter()
+        index = self.bot.index
+        data = encode(
+            time.time(),
+            self.shards,
+            index.autochannels,
+            index.temp_channels,
+            [server for _, server in self.bot.cache.items()],
+        )
+        await asyncio.get_event_loop().run_in_executor(None, self.write, data)
+        self.saves += 1
+        self.last_save = {
+            "bytes": len(data),
+            "save_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    @tasks.loop(minutes=5)
+    async def autosave(self):
+        try:
+            await self.save()
+        except OSError as e:
+            print(f"Failed to save snapshot {self.path}. Error: {e}")
+
+    def stats(self) -> dict:
+        stats = {"saves": self.saves, "refreshed": self.refreshed}
+        if self.restored:
+            stats.update(("restored_" + k, v) for k, v in self.restored.items())
+        if self.last_save:
+            stats.update(("last_" + k, v) for k, v in self.last_save.items())
+        return stats
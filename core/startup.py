@@ -0,0 +1,34 @@
+import time
+
+
+class StartupTimer:
+    """
+    Time spent in each startup stage, counted from when ``bot.py`` started
+    importing. Stages are marked in order, each one lasts until the next mark.
+    """
+
+    def __init__(self, started: float, import_budget: float = 1.0):
+        self.started = started
+        self.last = started
+        self.import_budget = import_budget
+        self.stages = {}
+
+    def mark(self, stage: str) -> float:
+        now = time.perf_counter()
+        self.stages[stage] = took = now - self.last
+        self.last = now
+        return took
+
+    @property
+    def total(self) -> float:
+        return self.last - self.started
+
+    def over_budget(self) -> bool:
+        return self.stages.get("imports", 0) > self.import_budget
+
+    def report(self) -> str:
+        stages = ", ".join(f"{stage} {took:.2f}s" for stage, took in self.stages.items())
+        return f"Started in {self.total:.2f}s ({stages})."
+
+    def stats(self) -> dict:
+        return {**self.stages, "total": self.total}
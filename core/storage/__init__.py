@@ -0,0 +1,45 @@
+import os
+
+from core.storage.base import Storage
+from core.storage.memory import MemoryStorage
+from core.storage.sqlite import SQLiteStorage
+from core.storage.writebehind import WriteBehindStorage
+
+
+def create_storage(backend: str = None) -> Storage:
+    """
+    Create the storage backend set by the ``STORAGE`` environment variable,
+    buffered by a ``WriteBehindStorage`` when ``WRITE_BEHIND_MS`` is set.
+    """
+    storage = create_backend(backend)
+    interval = float(os.environ.get("WRITE_BEHIND_MS", 0) or 0)
+    if interval > 0:
+        return WriteBehindStorage(
+            storage,
+            interval=interval / 1000,
+            batch_size=int(os.environ.get("WRITE_BEHIND_BATCH", 100)),
+        )
+    return storage
+
+
+def create_backend(backend: str = None) -> Storage:
+    backend = (backend or os.environ.get("STORAGE", None) or "mongo").strip().lower()
+    if backend == "mongo":
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        from core.metrics import MongoCommandMetrics
+        from core.storage.mongo import MongoStorage
+
+        mongo_uri = os.environ.get("MONGO_URI", None)
+        if mongo_uri is None or len(mongo_uri.strip()) == 0:
+            print("\nA mongodb uri is necessary for the bot to function.\n")
+            raise RuntimeError
+        return MongoStorage(
+            AsyncIOMotorClient(mongo_uri, event_listeners=[MongoCommandMetrics()]).sonus
+        )
+    if backend == "sqlite":
+        return SQLiteStorage(os.environ.get("SQLITE_PATH", "sonus.db"))
+    if backend == "memory":
+        return MemoryStorage()
+    print(f"\nUnknown storage backend {backend}, use mongo, sqlite or memory.\n")
+    raise RuntimeError
@@ -0,0 +1,103 @@
+class Storage:
+    """
+    Where Sonus keeps server configs, autochannels and temp channels.
+
+    Servers are dicts with an ``_id``, an ``autochannels`` dict of channel id
+    to config (or None) and any server wide settings. Every write stamps the
+    server with the unix time it was written, see ``updated_servers``. Temp channels are dicts
+    with an ``_id``, ``guild``, ``creator``, ``autochannel``, ``spare`` when
+    they are spare channels and ``delete_at`` when they emptied and will be
+    deleted at that unix time. All ids are strings except ``creator`` and
+    ``autochannel``.
+    """
+
+    name = None
+
+    async def setup(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def migrate(self) -> int:
+        return 0
+
+    async def needs_migration(self) -> bool:
+        """Whether any stored document is older than ``SCHEMA_VERSION``."""
+        return False
+
+    async def watch(self, cache):
+        """Keep ``cache`` in sync with writes from other processes."""
+
+    # Servers
+
+    async def get_server(self, server_id: str) -> dict:
+        raise NotImplementedError
+
+    async def set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        raise NotImplementedError
+
+    async def delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        raise NotImplementedError
+
+    async def prune_autochannels(self, missing: dict) -> int:
+        """Delete autochannels of many servers, ``missing`` maps server ids to channel ids."""
+        deleted = 0
+        for server_id, channel_ids in missing.items():
+            await self.delete_autochannels(server_id, channel_ids)
+            deleted += len(channel_ids)
+        return deleted
+
+    async def update_settings(self, server_id: str, settings: dict) -> dict:
+        raise NotImplementedError
+
+    async def delete_servers(self, server_ids: list) -> int:
+        raise NotImplementedError
+
+    def servers(self, after: str = None, limit: int = None):
+        """Async iterator of servers sorted by id, starting after ``after``."""
+        raise NotImplementedError
+
+    def updated_servers(self, since: float):
+        """Async iterator of servers written after the unix time ``since``."""
+        raise NotImplementedError
+
+    # Temp channels
+
+    async def get_temp_channel(self, channel_id: str, fields: tuple = None):
+        raise NotImplementedError
+
+    async def add_temp_channel(self, channel: dict):
+        raise NotImplementedError
+
+    async def claim_temp_channel(self, channel_id: str, creator: int):
+        raise NotImplementedError
+
+    async def set_temp_channel_expiry(self, channel_id: str, delete_at: float = None):
+        """Set when an empty temp channel will be deleted, None to keep it."""
+        raise NotImplementedError
+
+    async def delete_temp_channel(self, channel_id: str) -> bool:
+        """Returns whether the channel was a temp channel."""
+        raise NotImplementedError
+
+    async def delete_temp_channels(self, channel_ids: list) -> int:
+        raise NotImplementedError
+
+    async def write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        """
+        Apply a batch of temp channel writes, ``claims`` maps channel ids to
+        creators. Every channel id is in at most one of them.
+        """
+        for channel in adds:
+            await self.add_temp_channel(channel)
+        for channel_id, creator in claims.items():
+            await self.claim_temp_channel(channel_id, creator)
+        await self.delete_temp_channels(deletes)
+
+    async def delete_server_temp_channels(self, server_ids: list) -> int:
+        raise NotImplementedError
+
+    def temp_channels(self, after: str = None, limit: int = None, spare: bool = None):
+        """Async iterator of temp channels sorted by id, starting after ``after``."""
+        raise NotImplementedError
@@ -0,0 +1,119 @@
+import copy
+import time
+
+from core.storage.base import Storage
+
+
+class MemoryStorage(Storage):
+    """Keeps everything in dicts, for tests and benchmarks. Nothing is saved."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.server_documents = {}
+        self.channel_documents = {}
+
+    def _server(self, server_id: str) -> dict:
+        server = self.server_documents.get(server_id)
+        if server is None:
+            server = self.server_documents[server_id] = {
+                "_id": server_id,
+                "autochannels": dict(),
+            }
+        return server
+
+    # Copies are handed out so callers can't change stored documents by accident.
+
+    async def get_server(self, server_id: str) -> dict:
+        return copy.deepcopy(self._server(server_id))
+
+    async def set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        server = self._server(server_id)
+        server["autochannels"][channel_id] = copy.deepcopy(config)
+        server["updated_at"] = time.time()
+        return copy.deepcopy(server)
+
+    async def delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        server = self._server(server_id)
+        for channel_id in channel_ids:
+            server["autochannels"].pop(channel_id, None)
+        server["updated_at"] = time.time()
+        return copy.deepcopy(server)
+
+    async def update_settings(self, server_id: str, settings: dict) -> dict:
+        server = self._server(server_id)
+        server.update(copy.deepcopy(settings))
+        server["updated_at"] = time.time()
+        return copy.deepcopy(server)
+
+    async def delete_servers(self, server_ids: list) -> int:
+        deleted = 0
+        for server_id in server_ids:
+            deleted += self.server_documents.pop(server_id, None) is not None
+        return deleted
+
+    async def servers(self, after: str = None, limit: int = None):
+        ids = sorted(i for i in self.server_documents if after is None or i > after)
+        for server_id in ids[:limit]:
+            if server_id in self.server_documents:
+                yield copy.deepcopy(self.server_documents[server_id])
+
+    async def updated_servers(self, since: float):
+        for server in list(self.server_documents.values()):
+            if server.get("updated_at", 0) > since:
+                yield copy.deepcopy(server)
+
+    async def get_temp_channel(self, channel_id: str, fields: tuple = None):
+        channel = self.channel_documents.get(channel_id)
+        if channel is None:
+            return None
+        if fields:
+            return {k: v for k, v in channel.items() if k == "_id" or k in fields}
+        return dict(channel)
+
+    async def add_temp_channel(self, channel: dict):
+        self.channel_documents[channel["_id"]] = dict(channel)
+
+    async def claim_temp_channel(self, channel_id: str, creator: int):
+        channel = self.channel_documents.get(channel_id)
+        if channel is not None:
+            channel["creator"] = creator
+            channel.pop("spare", None)
+
+    async def set_temp_channel_expiry(self, channel_id: str, delete_at: float = None):
+        channel = self.channel_documents.get(channel_id)
+        if channel is None:
+            return
+        if delete_at is None:
+            channel.pop("delete_at", None)
+        else:
+            channel["delete_at"] = delete_at
+
+    async def delete_temp_channel(self, channel_id: str) -> bool:
+        return self.channel_documents.pop(channel_id, None) is not None
+
+    async def delete_temp_channels(self, channel_ids: list) -> int:
+        deleted = 0
+        for channel_id in channel_ids:
+            deleted += self.channel_documents.pop(channel_id, None) is not None
+        return deleted
+
+    async def delete_server_temp_channels(self, server_ids: list) -> int:
+        server_ids = set(server_ids)
+        channel_ids = [
+            channel_id
+            for channel_id, channel in self.channel_documents.items()
+            if channel["guild"] in server_ids
+        ]
+        return await self.delete_temp_channels(channel_ids)
+
+    async def temp_channels(self, after: str = None, limit: int = None, spare: bool = None):
+        ids = sorted(
+            channel_id
+            for channel_id, channel in self.channel_documents.items()
+            if (after is None or channel_id > after)
+            and (spare is None or bool(channel.get("spare")) == spare)
+        )
+        for channel_id in ids[:limit]:
+            if channel_id in self.channel_documents:
+                yield dict(self.channel_documents[channel_id])
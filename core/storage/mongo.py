@@ -0,0 +1,177 @@
+import time
+
+from pymongo import DeleteMany, ReplaceOne, ReturnDocument, UpdateOne
+
+from core.migrations import OUTDATED, SCHEMA_VERSION, migrate
+from core.storage.base import Storage
+
+
+def stamped(update: dict) -> dict:
+    """``update`` that also sets ``updated_at`` to now."""
+    return {**update, "$set": {**update.get("$set", {}), "updated_at": time.time()}}
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+
+    def __init__(self, db):
+        self.db = db
+        self.servers_collection = db.servers
+        self.channels_collection = db.channels
+
+    async def setup(self):
+        await self.servers_collection.create_index("updated_at")
+        await self.servers_collection.create_index("schema")
+        await self.channels_collection.create_index("guild")
+        await self.channels_collection.create_index("creator")
+        await self.channels_collection.create_index("autochannel")
+
+    async def migrate(self) -> int:
+        return await migrate(self.db)
+
+    async def needs_migration(self) -> bool:
+        return (
+            await self.servers_collection.find_one(OUTDATED, projection={"_id": 1})
+            is not None
+        )
+
+    async def watch(self, cache):
+        await cache.watch(self.servers_collection)
+
+    # Servers
+
+    async def update_server(self, server_id: str, update: dict) -> dict:
+        return await self.servers_collection.find_one_and_update(
+            {"_id": server_id},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get_server(self, server_id: str) -> dict:
+        return await self.update_server(
+            server_id,
+            {"$setOnInsert": {"autochannels": dict(), "schema": SCHEMA_VERSION}},
+        )
+
+    async def set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        return await self.update_server(
+            server_id, stamped({"$set": {f"autochannels.{channel_id}": config}})
+        )
+
+    async def delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        return await self.update_server(
+            server_id,
+            stamped({"$unset": {f"autochannels.{i}": "" for i in channel_ids}}),
+        )
+
+    async def prune_autochannels(self, missing: dict) -> int:
+        if not missing:
+            return 0
+        await self.servers_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": server_id},
+                    stamped({"$unset": {f"autochannels.{i}": "" for i in channel_ids}}),
+                )
+                for server_id, channel_ids in missing.items()
+            ],
+            ordered=False,
+        )
+        return sum(len(channel_ids) for channel_ids in missing.values())
+
+    async def update_settings(self, server_id: str, settings: dict) -> dict:
+        return await self.update_server(server_id, stamped({"$set": settings}))
+
+    async def delete_servers(self, server_ids: list) -> int:
+        if not server_ids:
+            return 0
+        result = await self.servers_collection.bulk_write(
+            [DeleteMany({"_id": {"$in": list(server_ids)}})]
+        )
+        return result.deleted_count
+
+    async def servers(self, after: str = None, limit: int = None):
+        query = {} if after is None else {"_id": {"$gt": after}}
+        cursor = self.servers_collection.find(query).sort("_id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        async for server in cursor:
+            yield server
+
+    async def updated_servers(self, since: float):
+        cursor = self.servers_collection.find({"updated_at": {"$gt": since}})
+        async for server in cursor:
+            yield server
+
+    # Temp channels
+
+    async def get_temp_channel(self, channel_id: str, fields: tuple = None):
+        projection = dict.fromkeys(fields, 1) if fields else None
+        return await self.channels_collection.find_one({"_id": channel_id}, projection)
+
+    async def add_temp_channel(self, channel: dict):
+        await self.channels_collection.insert_one(channel)
+
+    async def claim_temp_channel(self, channel_id: str, creator: int):
+        await self.channels_collection.update_one(
+            {"_id": channel_id},
+            {"$set": {"creator": creator}, "$unset": {"spare": ""}},
+        )
+
+    async def set_temp_channel_expiry(self, channel_id: str, delete_at: float = None):
+        if delete_at is None:
+            update = {"$unset": {"delete_at": ""}}
+        else:
+            update = {"$set": {"delete_at": delete_at}}
+        await self.channels_collection.update_one({"_id": channel_id}, update)
+
+    async def delete_temp_channel(self, channel_id: str) -> bool:
+        channel = await self.channels_collection.find_one_and_delete(
+            {"_id": channel_id}, projection={"_id": 1}
+        )
+        return channel is not None
+
+    async def delete_temp_channels(self, channel_ids: list) -> int:
+        if not channel_ids:
+            return 0
+        result = await self.channels_collection.bulk_write(
+            [DeleteMany({"_id": {"$in": list(channel_ids)}})]
+        )
+        return result.deleted_count
+
+    async def write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        # Replaces instead of inserts so a retried batch doesn't fail on duplicates.
+        requests = [
+            ReplaceOne({"_id": channel["_id"]}, channel, upsert=True)
+            for channel in adds
+        ]
+        requests.extend(
+            UpdateOne(
+                {"_id": channel_id},
+                {"$set": {"creator": creator}, "$unset": {"spare": ""}},
+            )
+            for channel_id, creator in claims.items()
+        )
+        if deletes:
+            requests.append(DeleteMany({"_id": {"$in": list(deletes)}}))
+        if requests:
+            await self.channels_collection.bulk_write(requests, ordered=False)
+
+    async def delete_server_temp_channels(self, server_ids: list) -> int:
+        if not server_ids:
+            return 0
+        result = await self.channels_collection.bulk_write(
+            [DeleteMany({"guild": {"$in": list(server_ids)}})]
+        )
+        return result.deleted_count
+
+    async def temp_channels(self, after: str = None, limit: int = None, spare: bool = None):
+        query = {} if after is None else {"_id": {"$gt": after}}
+        if spare is not None:
+            query["spare"] = {"$exists": True} if spare else {"$exists": False}
+        cursor = self.channels_collection.find(query).sort("_id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        async for channel in cursor:
+            yield channel
@@ -0,0 +1,355 @@
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.storage.base import Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS servers (
+    id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS autochannels (
+    id TEXT PRIMARY KEY,
+    guild TEXT NOT NULL,
+    config TEXT
+);
+CREATE INDEX IF NOT EXISTS autochannels_guild ON autochannels (guild);
+CREATE TABLE IF NOT EXISTS channels (
+    id TEXT PRIMARY KEY,
+    guild TEXT NOT NULL,
+    creator INTEGER,
+    autochannel INTEGER,
+    spare INTEGER NOT NULL DEFAULT 0,
+    delete_at REAL
+);
+CREATE INDEX IF NOT EXISTS channels_guild ON channels (guild);
+CREATE INDEX IF NOT EXISTS channels_creator ON channels (creator);
+CREATE INDEX IF NOT EXISTS channels_autochannel ON channels (autochannel);
+"""
+
+# Columns added after release, (table, column, definition)
+UPGRADES = (
+    # Grace periods
+    ("channels", "delete_at", "REAL"),
+    # Snapshots
+    ("servers", "updated_at", "REAL NOT NULL DEFAULT 0"),
+)
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded storage for small self hosted bots.
+
+    One connection in WAL mode is used from a single worker thread so the event
+    loop never blocks on disk. Every query is a constant string with bound
+    parameters, which sqlite compiles once and keeps in its statement cache.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "sonus.db"):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.connection = None
+
+    def run(self, function, *args):
+        return asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    def _connect(self):
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=256
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        for table, column, definition in UPGRADES:
+            columns = {
+                row[1]
+                for row in self.connection.execute(f"PRAGMA table_info({table})")
+            }
+            if column not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS servers_updated_at ON servers (updated_at)"
+        )
+        self.connection.commit()
+
+    async def setup(self):
+        if self.connection is None:
+            await self.run(self._connect)
+
+    async def close(self):
+        if self.connection is not None:
+            await self.run(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=False)
+
+    # Servers
+
+    def _server(self, server_id: str) -> dict:
+        connection = self.connection
+        connection.execute(
+            "INSERT OR IGNORE INTO servers (id) VALUES (?)", (server_id,)
+        )
+        settings = connection.execute(
+            "SELECT settings FROM servers WHERE id = ?", (server_id,)
+        ).fetchone()[0]
+        autochannels = connection.execute(
+            "SELECT id, config FROM autochannels WHERE guild = ?", (server_id,)
+        ).fetchall()
+        connection.commit()
+        return {
+            **json.loads(settings),
+            "_id": server_id,
+            "autochannels": {
+                channel_id: json.loads(config) if config else None
+                for channel_id, config in autochannels
+            },
+        }
+
+    async def get_server(self, server_id: str) -> dict:
+        return await self.run(self._server, server_id)
+
+    def _touch(self, server_ids):
+        now = time.time()
+        rows = [(server_id,) for server_id in server_ids]
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO servers (id) VALUES (?)", rows
+        )
+        self.connection.executemany(
+            "UPDATE servers SET updated_at = ? WHERE id = ?",
+            [(now, server_id) for server_id in server_ids],
+        )
+
+    def _set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO autochannels (id, guild, config) VALUES (?, ?, ?)",
+            (channel_id, server_id, json.dumps(config) if config is not None else None),
+        )
+        self._touch((server_id,))
+        return self._server(server_id)
+
+    async def set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        return await self.run(self._set_autochannel, server_id, channel_id, config)
+
+    def _delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        self.connection.executemany(
+            "DELETE FROM autochannels WHERE id = ? AND guild = ?",
+            [(channel_id, server_id) for channel_id in channel_ids],
+        )
+        self._touch((server_id,))
+        return self._server(server_id)
+
+    async def delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        return await self.run(self._delete_autochannels, server_id, channel_ids)
+
+    def _prune_autochannels(self, missing: dict) -> int:
+        cursor = self.connection.executemany(
+            "DELETE FROM autochannels WHERE id = ? AND guild = ?",
+            [
+                (channel_id, server_id)
+                for server_id, channel_ids in missing.items()
+                for channel_id in channel_ids
+            ],
+        )
+        self._touch(list(missing))
+        self.connection.commit()
+        return cursor.rowcount
+
+    async def prune_autochannels(self, missing: dict) -> int:
+        return await self.run(self._prune_autochannels, missing)
+
+    def _update_settings(self, server_id: str, settings: dict) -> dict:
+        server = self._server(server_id)
+        stored = {
+            k: v for k, v in server.items() if k not in ("_id", "autochannels")
+        }
+        stored.update(settings)
+        self.connection.execute(
+            "UPDATE servers SET settings = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(stored), time.time(), server_id),
+        )
+        self.connection.commit()
+        server.update(settings)
+        return server
+
+    async def update_settings(self, server_id: str, settings: dict) -> dict:
+        return await self.run(self._update_settings, server_id, settings)
+
+    def _delete_servers(self, server_ids: list) -> int:
+        rows = [(server_id,) for server_id in server_ids]
+        self.connection.executemany("DELETE FROM autochannels WHERE guild = ?", rows)
+        cursor = self.connection.executemany("DELETE FROM servers WHERE id = ?", rows)
+        self.connection.commit()
+        return cursor.rowcount
+
+    async def delete_servers(self, server_ids: list) -> int:
+        return await self.run(self._delete_servers, server_ids)
+
+    def _server_ids(self, after: str, limit: int) -> list:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT id FROM servers WHERE id > ? ORDER BY id LIMIT ?",
+                (after or "", limit or -1),
+            )
+        ]
+
+    async def servers(self, after: str = None, limit: int = None):
+        for server_id in await self.run(self._server_ids, after, limit):
+            yield await self.get_server(server_id)
+
+    def _updated_server_ids(self, since: float) -> list:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT id FROM servers WHERE updated_at > ?", (since,)
+            )
+        ]
+
+    async def updated_servers(self, since: float):
+        for server_id in await self.run(self._updated_server_ids, since):
+            yield await self.get_server(server_id)
+
+    # Temp channels
+
+    @staticmethod
+    def _channel(row) -> dict:
+        channel = {
+            "_id": row[0],
+            "guild": row[1],
+            "creator": row[2],
+            "autochannel": row[3],
+        }
+        if row[4]:
+            channel["spare"] = True
+        if row[5] is not None:
+            channel["delete_at"] = row[5]
+        return channel
+
+    def _get_temp_channel(self, channel_id: str):
+        row = self.connection.execute(
+            "SELECT id, guild, creator, autochannel, spare, delete_at FROM channels "
+            "WHERE id = ?",
+            (channel_id,),
+        ).fetchone()
+        return self._channel(row) if row else None
+
+    async def get_temp_channel(self, channel_id: str, fields: tuple = None):
+        return await self.run(self._get_temp_channel, channel_id)
+
+    def _add_temp_channel(self, channel: dict):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO channels "
+            "(id, guild, creator, autochannel, spare, delete_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                channel["_id"],
+                channel["guild"],
+                channel.get("creator"),
+                channel.get("autochannel"),
+                int(bool(channel.get("spare"))),
+                channel.get("delete_at"),
+            ),
+        )
+        self.connection.commit()
+
+    async def add_temp_channel(self, channel: dict):
+        await self.run(self._add_temp_channel, channel)
+
+    def _claim_temp_channel(self, channel_id: str, creator: int):
+        self.connection.execute(
+            "UPDATE channels SET creator = ?, spare = 0 WHERE id = ?",
+            (creator, channel_id),
+        )
+        self.connection.commit()
+
+    async def claim_temp_channel(self, channel_id: str, creator: int):
+        await self.run(self._claim_temp_channel, channel_id, creator)
+
+    def _set_temp_channel_expiry(self, channel_id: str, delete_at):
+        self.connection.execute(
+            "UPDATE channels SET delete_at = ? WHERE id = ?", (delete_at, channel_id)
+        )
+        self.connection.commit()
+
+    async def set_temp_channel_expiry(self, channel_id: str, delete_at: float = None):
+        await self.run(self._set_temp_channel_expiry, channel_id, delete_at)
+
+    def _delete_temp_channels(self, channel_ids: list) -> int:
+        cursor = self.connection.executemany(
+            "DELETE FROM channels WHERE id = ?",
+            [(channel_id,) for channel_id in channel_ids],
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    async def delete_temp_channel(self, channel_id: str) -> bool:
+        return await self.run(self._delete_temp_channels, [channel_id]) > 0
+
+    async def delete_temp_channels(self, channel_ids: list) -> int:
+        return await self.run(self._delete_temp_channels, channel_ids)
+
+    def _write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        connection = self.connection
+        connection.executemany(
+            "INSERT OR REPLACE INTO channels "
+            "(id, guild, creator, autochannel, spare, delete_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    channel["_id"],
+                    channel["guild"],
+                    channel.get("creator"),
+                    channel.get("autochannel"),
+                    int(bool(channel.get("spare"))),
+                    channel.get("delete_at"),
+                )
+                for channel in adds
+            ],
+        )
+        connection.executemany(
+            "UPDATE channels SET creator = ?, spare = 0 WHERE id = ?",
+            [(creator, channel_id) for channel_id, creator in claims.items()],
+        )
+        connection.executemany(
+            "DELETE FROM channels WHERE id = ?", [(channel_id,) for channel_id in deletes]
+        )
+        connection.commit()
+
+    async def write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        await self.run(self._write_temp_channels, adds, claims, deletes)
+
+    def _delete_server_temp_channels(self, server_ids: list) -> int:
+        cursor = self.connection.executemany(
+            "DELETE FROM channels WHERE guild = ?",
+            [(server_id,) for server_id in server_ids],
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    async def delete_server_temp_channels(self, server_ids: list) -> int:
+        return await self.run(self._delete_server_temp_channels, server_ids)
+
+    def _temp_channels(self, after: str, limit: int, spare) -> list:
+        if spare is None:
+            rows = self.connection.execute(
+                "SELECT id, guild, creator, autochannel, spare, delete_at FROM channels "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (after or "", limit or -1),
+            )
+        else:
+            rows = self.connection.execute(
+                "SELECT id, guild, creator, autochannel, spare, delete_at FROM channels "
+                "WHERE id > ? AND spare = ? ORDER BY id LIMIT ?",
+                (after or "", int(spare), limit or -1),
+            )
+        return [self._channel(row) for row in rows]
+
+    async def temp_channels(self, after: str = None, limit: int = None, spare: bool = None):
+        for channel in await self.run(self._temp_channels, after, limit, spare):
+            yield channel
@@ -0,0 +1,298 @@
+import asyncio
+
+from core.storage.base import Storage
+
+ADD = "add"
+CLAIM = "claim"
+DELETE = "delete"
+
+
+def merge(old, new, flushed: bool = False):
+    """
+    Merge a pending temp channel write ``old`` with a newer one, returns the
+    single write that has the same effect or None if nothing needs writing.
+    ``flushed`` is set when ``old`` may already be stored.
+    """
+    if old is None or new[0] == ADD:
+        return new
+    if new[0] == CLAIM:
+        if old[0] == ADD:
+            channel = dict(old[1], creator=new[1])
+            channel.pop("spare", None)
+            return ADD, channel
+        if old[0] == CLAIM:
+            return new
+        return old
+    # Deleting a channel that was never stored needs no write at all.
+    if old[0] == ADD and not flushed:
+        return None
+    return new
+
+
+class WriteBehindStorage(Storage):
+    """
+    Buffers temp channel writes and stores them in batches.
+
+    Adds, claims and deletes of the same channel are merged while pending, so a
+    member joining and leaving within ``interval`` seconds costs no writes at
+    all. Pending writes are sent with one ``write_temp_channels`` call (a single
+    ``bulk_write`` on mongo) ``interval`` seconds after the first one, or right
+    away once ``batch_size`` channels are pending. Server configs are written
+    straight through, commands need the updated document back.
+
+    Guarantees, checked by ``python -m bench.writebehind``:
+
+    - Reads of a temp channel see its pending writes.
+    - Bulk deletes and iterating temp channels flush first.
+    - ``close`` flushes everything still pending, retrying failed batches.
+    - A failed batch is merged back under any newer writes and retried after
+      ``retry`` seconds, so writes are never applied out of order. Part of it
+      may have been stored, so its channels are merged as possibly stored
+      until they've been written.
+    - If the process dies without closing, at most ``interval`` seconds or
+      ``batch_size`` channels of writes are lost. Lost deletes leave stale
+      records that reconcile removes on the next start. Lost adds leave a temp
+      channel Sonus doesn't know about, which won't be deleted automatically.
+
+    ``delete_temp_channel`` reads the channel if it has no pending writes, to
+    only return True for channels that are or may be stored.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        interval: float = 0.05,
+        batch_size: int = 100,
+        retry: float = 1,
+        log=print,
+    ):
+        self.storage = storage
+        self.name = storage.name
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retry = retry
+        self.log = log
+        # channel id -> (ADD, channel) or (CLAIM, creator) or (DELETE, None)
+        self.pending = {}
+        # The batch being written right now
+        self.writing = {}
+        # Channels of failed batches, which may be partly stored
+        self.maybe_stored = set()
+        self.timer = None
+        self.flushing = None
+        self.received = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+
+    def queue(self, channel_id: str, write: tuple):
+        self.received += 1
+        merged = merge(
+            self.pending.get(channel_id),
+            write,
+            flushed=channel_id in self.maybe_stored or channel_id in self.writing,
+        )
+        if merged is None:
+            del self.pending[channel_id]
+        else:
+            self.pending[channel_id] = merged
+        if len(self.pending) >= self.batch_size:
+            asyncio.ensure_future(self.flush())
+        elif self.timer is None and self.pending:
+            self.schedule(self.interval)
+
+    def schedule(self, delay: float):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_event_loop().call_later(
+            delay, lambda: asyncio.ensure_future(self.flush())
+        )
+
+    async def flush(self):
+        while self.flushing is not None:
+            await self.flushing
+        if not self.pending:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.writing, self.pending = self.pending, {}
+        self.flushing = task = asyncio.ensure_future(self.write(self.writing))
+        try:
+            await task
+        finally:
+            self.writing = {}
+            if self.flushing is task:
+                self.flushing = None
+
+    async def write(self, batch: dict):
+        adds = [write[1] for write in batch.values() if write[0] == ADD]
+        claims = {
+            channel_id: write[1]
+            for channel_id, write in batch.items()
+            if write[0] == CLAIM
+        }
+        deletes = [
+            channel_id for channel_id, write in batch.items() if write[0] == DELETE
+        ]
+        try:
+            await self.storage.write_temp_channels(adds, claims, deletes)
+        except Exception as e:
+            self.failures += 1
+            self.log(f"Failed to write {len(batch)} temp channels. Error: {e}")
+            self.maybe_stored.update(batch)
+            for channel_id, write in batch.items():
+                newer = self.pending.get(channel_id)
+                self.pending[channel_id] = (
+                    write if newer is None else merge(write, newer, flushed=True)
+                )
+            self.schedule(self.retry)
+            return
+        self.batches += 1
+        self.written += len(batch)
+        if self.maybe_stored:
+            # Writes queued since were merged as possibly stored already.
+            self.maybe_stored.difference_update(
+                channel_id for channel_id in batch if channel_id not in self.pending
+            )
+
+    async def setup(self):
+        await self.storage.setup()
+
+    async def close(self):
+        for _ in range(3):
+            await self.flush()
+            if not self.pending:
+                break
+        if self.pending:
+            self.log(f"Lost {len(self.pending)} temp channel writes.")
+        if self.timer is not None:
+            self.timer.cancel()
+        await self.storage.close()
+
+    async def migrate(self) -> int:
+        return await self.storage.migrate()
+
+    async def needs_migration(self) -> bool:
+        return await self.storage.needs_migration()
+
+    async def watch(self, cache):
+        await self.storage.watch(cache)
+
+    # Servers
+
+    async def get_server(self, server_id: str) -> dict:
+        return await self.storage.get_server(server_id)
+
+    async def set_autochannel(self, server_id: str, channel_id: str, config) -> dict:
+        return await self.storage.set_autochannel(server_id, channel_id, config)
+
+    async def delete_autochannels(self, server_id: str, channel_ids: list) -> dict:
+        return await self.storage.delete_autochannels(server_id, channel_ids)
+
+    async def prune_autochannels(self, missing: dict) -> int:
+        return await self.storage.prune_autochannels(missing)
+
+    async def update_settings(self, server_id: str, settings: dict) -> dict:
+        return await self.storage.update_settings(server_id, settings)
+
+    async def delete_servers(self, server_ids: list) -> int:
+        return await self.storage.delete_servers(server_ids)
+
+    def servers(self, after: str = None, limit: int = None):
+        return self.storage.servers(after, limit)
+
+    def updated_servers(self, since: float):
+        return self.storage.updated_servers(since)
+
+    # Temp channels
+
+    def pending_write(self, channel_id: str):
+        """The write of a channel that isn't stored yet, if any."""
+        write = self.pending.get(channel_id)
+        writing = self.writing.get(channel_id)
+        if write is None or writing is None:
+            return write or writing
+        return merge(writing, write, flushed=True)
+
+    async def get_temp_channel(self, channel_id: str, fields: tuple = None):
+        write = self.pending_write(channel_id)
+        if write is None:
+            return await self.storage.get_temp_channel(channel_id, fields)
+        if write[0] == DELETE:
+            return None
+        if write[0] == ADD:
+            channel = write[1]
+        else:
+            channel = await self.storage.get_temp_channel(channel_id)
+            if channel is None:
+                return None
+            channel = dict(channel, creator=write[1])
+            channel.pop("spare", None)
+        if fields:
+            return {k: v for k, v in channel.items() if k == "_id" or k in fields}
+        return dict(channel)
+
+    async def add_temp_channel(self, channel: dict):
+        self.queue(channel["_id"], (ADD, dict(channel)))
+
+    async def claim_temp_channel(self, channel_id: str, creator: int):
+        self.queue(channel_id, (CLAIM, creator))
+
+    async def set_temp_channel_expiry(self, channel_id: str, delete_at: float = None):
+        while True:
+            write = self.pending.get(channel_id)
+            if write is not None and write[0] == ADD:
+                channel = write[1]
+                if delete_at is None:
+                    channel.pop("delete_at", None)
+                else:
+                    channel["delete_at"] = delete_at
+                return
+            if write is not None and write[0] == DELETE:
+                return
+            # Only the expiry field is written, so only an add that is being
+            # written right now has to land first.
+            if self.flushing is None or channel_id not in self.writing:
+                break
+            await self.flushing
+        await self.storage.set_temp_channel_expiry(channel_id, delete_at)
+
+    async def delete_temp_channel(self, channel_id: str) -> bool:
+        write = self.pending_write(channel_id)
+        if write is None:
+            stored = await self.storage.get_temp_channel(channel_id, ("_id",))
+            # Something may have been queued while reading.
+            write = self.pending_write(channel_id)
+            if write is None and stored is None:
+                return False
+        if write is not None and write[0] == DELETE:
+            return False
+        self.queue(channel_id, (DELETE, None))
+        return True
+
+    async def delete_temp_channels(self, channel_ids: list) -> int:
+        await self.flush()
+        return await self.storage.delete_temp_channels(channel_ids)
+
+    async def delete_server_temp_channels(self, server_ids: list) -> int:
+        await self.flush()
+        return await self.storage.delete_server_temp_channels(server_ids)
+
+    async def write_temp_channels(self, adds: list, claims: dict, deletes: list):
+        await self.flush()
+        await self.storage.write_temp_channels(adds, claims, deletes)
+
+    async def temp_channels(self, after: str = None, limit: int = None, spare: bool = None):
+        await self.flush()
+        async for channel in self.storage.temp_channels(after, limit, spare):
+            yield channel
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "received": self.received,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+        }
@@ -0,0 +1,93 @@
+import asyncio
+import math
+import traceback
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel for many timers that are usually cancelled.
+
+    Timers are kept in ``slots`` buckets that one task visits every
+    ``resolution`` seconds, instead of one sleeping task per timer. Scheduling
+    and cancelling are O(1), a timer fires up to ``resolution`` seconds late.
+    Callbacks get the timer's key and must not block.
+    """
+
+    def __init__(self, resolution: float = 1, slots: int = 512):
+        self.resolution = resolution
+        self.slots = slots
+        # slot -> {key: [rounds left, callback]}
+        self.wheel = [dict() for _ in range(slots)]
+        # key -> slot
+        self.timers = {}
+        self.position = 0
+        self.task = None
+        self.fired = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def schedule(self, key, delay: float, callback):
+        """Call ``callback(key)`` in ``delay`` seconds, replacing a timer with the same key."""
+        if key in self.timers:
+            del self.wheel[self.timers.pop(key)][key]
+        ticks = max(1, math.ceil(delay / self.resolution))
+        slot = (self.position + ticks) % self.slots
+        self.wheel[slot][key] = [(ticks - 1) // self.slots, callback]
+        self.timers[key] = slot
+
+    def cancel(self, key) -> bool:
+        """Returns whether there was a timer to cancel."""
+        slot = self.timers.pop(key, None)
+        if slot is None:
+            return False
+        del self.wheel[slot][key]
+        self.cancelled += 1
+        return True
+
+    def tick(self):
+        self.position = (self.position + 1) % self.slots
+        bucket = self.wheel[self.position]
+        due = []
+        for key, timer in bucket.items():
+            if timer[0] == 0:
+                due.append((key, timer[1]))
+            else:
+                timer[0] -= 1
+        for key, callback in due:
+            del bucket[key]
+            del self.timers[key]
+            self.fired += 1
+            try:
+                callback(key)
+            except Exception:
+                traceback.print_exc()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        next_tick = loop.time()
+        while True:
+            # Scheduled from the last tick so the wheel doesn't drift.
+            next_tick += self.resolution
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+            self.tick()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.timers),
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+        }
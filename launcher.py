@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import os
+import sys
+
+import aiohttp
+from dotenv import load_dotenv
+
+from core.cluster import STUB_GUILDS, Launcher, run_stub_worker, run_worker
+
+
+async def recommended_shards(token: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v8/gateway/bot",
+            headers={"Authorization": "Bot " + token},
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run Sonus across processes.")
+    parser.add_argument(
+        "-c",
+        "--clusters",
+        type=int,
+        default=int(os.environ.get("CLUSTERS", os.cpu_count() or 1)),
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-s",
+        "--shards",
+        type=int,
+        default=int(os.environ.get("SHARD_COUNT", 0)) or None,
+        help="total number of shards, asks Discord when not set",
+    )
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="run stub workers that don't connect to Discord",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        help="stop after this many reports, stub runs exit with 1 if totals were wrong",
+    )
+    args = parser.parse_args()
+
+    shard_count = args.shards
+    if shard_count is None:
+        if args.stub:
+            shard_count = args.clusters
+        else:
+            token = os.environ.get("TOKEN", None)
+            if token is None or len(token.strip()) == 0:
+                print("\nA bot token is necessary for the bot to function.\n")
+                raise RuntimeError
+            shard_count = asyncio.get_event_loop().run_until_complete(
+                recommended_shards(token)
+            )
+    clusters = min(args.clusters, shard_count)
+    print(f"Launching {shard_count} shards in {clusters} clusters.")
+    if args.stub:
+        launcher = Launcher(
+            shard_count,
+            clusters,
+            target=run_stub_worker,
+            interval=1,
+            expected_guilds=STUB_GUILDS * shard_count,
+        )
+    else:
+        launcher = Launcher(shard_count, clusters)
+    if not launcher.run(args.rounds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()